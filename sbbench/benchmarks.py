@@ -0,0 +1,209 @@
+"""
+Benchmarks run by ``manage.py benchmark``.
+
+A benchmark is a function yielding ``(case, callable)`` pairs, each
+callable is timed separately by the command. Benchmarks of views and
+actions run against the dataset made by ``manage.py generate_dataset``.
+"""
+from collections import OrderedDict
+from datetime import timedelta
+import random
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+import babel.dates
+
+from sbbench import dataset
+from sbbench.dataset import make_lyrics, edit_lyrics
+from songbook import diff
+from songbook import jinja2env
+import sbcomment.actions
+import sbcomment.feeds
+import sbcomment.models
+import sbgig.models
+import sbgig.views
+import sbsong.models
+import sbsong.views
+
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+@benchmark
+def textdiff():
+    engines = [
+        ('sequence-matcher', diff.DiffEngine(diff.sequence_matcher_opcodes)),
+        ('myers', diff.DiffEngine(diff.myers_opcodes,
+                                  max_size=settings.SB_TEXTDIFF_MAX_SIZE,
+                                  max_cost=settings.SB_TEXTDIFF_MAX_COST)),
+    ]
+    for size in (4096, 16384, 65536):
+        prev = make_lyrics(size)
+        edits = [
+            ('one line', edit_lyrics(prev, every=len(prev))),
+            ('every 10th line', edit_lyrics(prev, every=10)),
+            ('rewritten', make_lyrics(size, seed=1)),
+        ]
+        for edit_name, new in edits:
+            for engine_name, engine in engines:
+                case = '%s, %dKB, %s' % (engine_name, size // 1024, edit_name)
+                yield case, (lambda engine=engine, new=new:
+                             engine.textdiff(prev, new))
+
+
+@benchmark
+def dates():
+    rnd = random.Random(0)
+    now = timezone.now()
+    timestamps = [now - timedelta(seconds=rnd.randint(0, 3600 * 24 * 400))
+                  for i in range(1000)]
+    locale = jinja2env._get_babel_locale()
+    tz = timezone.get_current_timezone()
+
+    def babel_datetime():
+        for dt in timestamps:
+            babel.dates.format_datetime(dt, format='medium', locale=locale,
+                                        tzinfo=tz)
+
+    def babel_timedelta():
+        for dt in timestamps:
+            babel.dates.format_timedelta(dt - timezone.now(),
+                                         add_direction=True, locale=locale)
+
+    def cached_datetime():
+        for dt in timestamps:
+            jinja2env.format_datetime(dt)
+
+    def cached_timedelta():
+        for dt in timestamps:
+            jinja2env.format_timedelta(dt)
+
+    yield 'babel format_datetime x1000', babel_datetime
+    yield 'cached format_datetime x1000', cached_datetime
+    yield 'babel format_timedelta x1000', babel_timedelta
+    yield 'cached format_timedelta x1000', cached_timedelta
+
+
+def _get_dataset_gig():
+    gig = dataset.get_gig()
+    if gig is None:
+        raise CommandError("No benchmark dataset, run generate_dataset first")
+    return gig
+
+
+def _request(user, path='/', **params):
+    request = RequestFactory().get(path, params)
+    request.user = user
+    return request
+
+
+@benchmark
+def views():
+    # RequestFactory's host is only allowed by DEBUG with empty
+    # ALLOWED_HOSTS; cases are run while the generator waits in here
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        yield from _view_cases()
+
+
+def _view_cases():
+    gig = _get_dataset_gig()
+    song = gig.songs.annotate(num_comments=Count('comments')) \
+                    .order_by('-num_comments').first()
+    user = song.watchers.first().user
+    feed = sbcomment.feeds.GigCommentsFeed()
+    oldest_comment = song.comments.order_by('seq').first()
+    deep_comment = gig.comments.filter(
+        comment_type__in=sbcomment.models.Comment.GIG_ONLY_COMMENTS
+    ).order_by('seq')[settings.SB_COMMENTS_ON_PAGE]
+
+    yield 'view_gig', lambda: sbgig.views.view_gig(_request(user), gig.slug)
+    yield 'view_song', lambda: sbsong.views.view_song(_request(user), song.id)
+    yield 'setlist', lambda: sbgig.views.setlist(_request(user), gig.slug)
+    yield '_get_comments, gig', lambda: sbgig.views._get_comments(
+        _request(user), gig, None
+    )
+    yield '_get_comments, song', lambda: sbgig.views._get_comments(
+        _request(user), gig, song
+    )
+    yield '_get_comments, song, new', lambda: sbgig.views._get_comments(
+        _request(user, after=oldest_comment.seq), gig, song
+    )
+    yield '_get_comments, gig, deep', lambda: sbgig.views._get_comments(
+        _request(user, before=deep_comment.seq), gig, None
+    )
+    yield 'GigCommentsFeed', lambda: feed(_request(user), slug=gig.slug)
+    # served from the feed cache, the first run builds it
+    yield 'gig_comments_feed', lambda: sbcomment.feeds.gig_comments_feed(
+        _request(user), slug=gig.slug
+    )
+
+
+def _rolled_back(func):
+    # write paths are measured in a transaction which is rolled back,
+    # so that every run starts with the same data
+    def run():
+        with transaction.atomic():
+            func()
+            transaction.set_rollback(True)
+    return run
+
+
+@benchmark
+def actions():
+    gig = _get_dataset_gig()
+    song = gig.songs.first()
+    user = song.watchers.first().user
+    part = song.parts.first()
+    link = song.links.first()
+
+    def song_comment_written():
+        sbcomment.actions.song_comment_written(song, user, "Nice one")
+
+    def joined_part():
+        old_performers = list(part.songperformer_set.all())
+        part.songperformer_set.filter(performer=user).delete()
+        sbsong.models.SongPerformer.objects.create(part=part, performer=user)
+        sbcomment.actions.joined_part(user, part, old_performers)
+
+    def left_part():
+        old_performers = list(part.songperformer_set.all())
+        part.songperformer_set.filter(performer=user).delete()
+        sbcomment.actions.left_part(user, part, old_performers,
+                                    changed_by=user)
+
+    def edited_song():
+        edited = sbsong.models.Song.objects.get(pk=song.pk)
+        edited.description = edit_lyrics(edited.description, every=3)
+        edited.save()
+        sbcomment.actions.edited_song(user, edited)
+
+    def edited_link():
+        old_links = list(song.links.all())
+        link.notice = 'edited'
+        link.save()
+        sbcomment.actions.edited_link(user, song, old_links)
+
+    def edited_gig():
+        edited = sbgig.models.Gig.objects.get(pk=gig.pk)
+        edited.description = edit_lyrics(edited.description, every=2)
+        edited.save()
+        sbcomment.actions.edited_gig(user, edited)
+
+    for func in (song_comment_written, joined_part, left_part, edited_song,
+                 edited_link, edited_gig):
+        yield func.__name__, _rolled_back(func)
+    # the same with bookkeeping jobs only enqueued, as the request of
+    # a change sees them with SB_JOBS_MODE = 'thread' or 'worker'
+    for func in (joined_part, left_part, edited_song, edited_link):
+        yield '%s, queued' % func.__name__, _rolled_back(
+            override_settings(SB_JOBS_MODE='worker')(func)
+        )
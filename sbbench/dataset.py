@@ -0,0 +1,255 @@
+"""
+Synthetic band dataset for benchmarks.
+
+All generated gigs and users have ``bench-`` prefixed slugs and usernames,
+so the dataset can be removed without touching real data.
+"""
+from datetime import timedelta
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from songbook.bulk import create_and_fetch
+from songbook.jinja2env import textdiff
+from songbook.markup import render_markdown
+import sbcomment.models
+import sbgig.models
+import sbsong.links
+import sbsong.models
+import sbsong.staffing
+import sbuser.models
+
+
+PREFIX = 'bench-'
+
+_WORDS = ('love', 'night', 'road', 'heart', 'fire', 'rain', 'home', 'light',
+          'baby', 'dream', 'sky', 'river', 'time', 'gone', 'never', 'again',
+          'walk', 'city', 'stone', 'blue', 'sun', 'cold', 'dance', 'away')
+
+_INSTRUMENTS = ('Vocals', 'Guitar', 'Bass', 'Drums', 'Keys', 'Violin',
+                'Trumpet', 'Saxophone')
+
+_LINKS = (
+    ('https://www.youtube.com/watch?v=bench%06d', 'live version'),
+    ('https://music.yandex.ru/album/1/track/%d', ''),
+    ('http://example.com/chords/%d', 'chords'),
+)
+
+_COMMENT_TYPES = (
+    sbcomment.models.Comment.CT_SONG_COMMENT,
+    sbcomment.models.Comment.CT_SONG_EDIT,
+    sbcomment.models.Comment.CT_SONG_EDIT,
+    sbcomment.models.Comment.CT_GIG_COMMENT,
+)
+
+Comment = sbcomment.models.Comment
+
+
+def make_lyrics(size, seed=0):
+    rnd = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size:
+        line = ' '.join(rnd.choice(_WORDS)
+                        for i in range(rnd.randint(3, 8))) + '\n'
+        lines.append(line)
+        length += len(line)
+    return ''.join(lines)
+
+
+def edit_lyrics(text, every, seed=0):
+    rnd = random.Random(seed)
+    lines = text.splitlines(True)
+    for idx in range(0, len(lines), every):
+        words = lines[idx].split()
+        words[rnd.randrange(len(words))] = rnd.choice(_WORDS).upper()
+        lines[idx] = ' '.join(words) + '\n'
+    return ''.join(lines)
+
+
+def clear():
+    """
+    Remove previously generated dataset.
+    """
+    with transaction.atomic():
+        sbgig.models.Gig.objects.filter(slug__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+
+
+def get_gig():
+    """
+    Return the most recently generated gig, or None.
+    """
+    gigs = sbgig.models.Gig.objects.filter(slug__startswith=PREFIX)
+    return gigs.order_by('-id').first()
+
+
+@transaction.atomic
+def generate(*, gigs=5, songs_per_gig=30, users=20, parts_per_song=4,
+             links_per_song=2, comments_per_song=20, seed=0):
+    rnd = random.Random(seed)
+    users = _create_users(rnd, users)
+    instruments = _get_instruments()
+    today = timezone.now().date()
+    num_gigs = gigs
+    new_gigs = []
+    for idx in range(num_gigs):
+        description = make_lyrics(200, seed=idx)
+        new_gigs.append(sbgig.models.Gig(
+            title='Bench gig %d' % idx, slug='%sgig-%d' % (PREFIX, idx),
+            date=today + timedelta(days=30 * (idx + 1 - num_gigs)),
+            description=description,
+            description_html=render_markdown(description),
+        ))
+    gigs = create_and_fetch(sbgig.models.Gig, new_gigs,
+                            slug__startswith=PREFIX)
+    for gig in gigs:
+        _create_songs(rnd, gig, users, instruments, songs_per_gig,
+                      parts_per_song, links_per_song, comments_per_song)
+    return gigs
+
+
+def _create_users(rnd, num_users):
+    password = make_password(None)
+    users = create_and_fetch(
+        User,
+        [User(username='%suser-%d' % (PREFIX, idx), password=password)
+         for idx in range(num_users)],
+        username__startswith=PREFIX,
+    )
+    profiles = []
+    for user in users:
+        about_myself = make_lyrics(100, seed=user.id)
+        profiles.append(sbuser.models.Profile(
+            user=user, gender=rnd.choice('fm'), about_myself=about_myself,
+            about_myself_html=render_markdown(about_myself),
+            password_change_required=False,
+        ))
+    sbuser.models.Profile.objects.bulk_create(profiles)
+    return users
+
+
+def _get_instruments():
+    instruments = []
+    for name in _INSTRUMENTS:
+        instrument, created = sbsong.models.Instrument.objects.get_or_create(
+            name=name
+        )
+        instruments.append(instrument)
+    return instruments
+
+
+def _create_songs(rnd, gig, users, instruments, num_songs, parts_per_song,
+                  links_per_song, comments_per_song):
+    new_songs = []
+    for idx in range(num_songs):
+        description = make_lyrics(300, seed=idx)
+        new_songs.append(sbsong.models.Song(
+            gig=gig, suggested_by=rnd.choice(users),
+            changed_by=rnd.choice(users), title='Song %d' % idx,
+            artist='Artist %d' % rnd.randint(1, 50),
+            description=description,
+            description_html=render_markdown(description),
+            lyrics=make_lyrics(1500, seed=idx),
+        ))
+    songs = create_and_fetch(sbsong.models.Song, new_songs, gig=gig)
+    song_ids = [song.id for song in songs]
+
+    parts = create_and_fetch(
+        sbsong.models.SongPart,
+        [sbsong.models.SongPart(song=song,
+                                instrument=rnd.choice(instruments),
+                                required=rnd.random() < 0.8)
+         for song in songs
+         for idx in range(parts_per_song)],
+        song_id__in=song_ids,
+    )
+    performers = []
+    for part in parts:
+        num_performers = min(len(users), rnd.choice((0, 1, 1, 1, 2)))
+        for user in rnd.sample(users, num_performers):
+            performers.append(sbsong.models.SongPerformer(
+                part=part, performer=user,
+                readiness=rnd.choice((0, 25, 50, 75, 100))
+            ))
+    sbsong.models.SongPerformer.objects.bulk_create(performers)
+    # bulk inserts don't send signals which maintain staffing summaries
+    # and songs' staffed and readiness
+    sbsong.staffing.recompute_song_stats(song_ids)
+
+    watchers = []
+    for song in songs:
+        for user in rnd.sample(users, min(len(users), 5)):
+            watchers.append(sbsong.models.SongWatcher(song=song, user=user))
+    sbsong.models.SongWatcher.objects.bulk_create(watchers)
+
+    links = []
+    for song in songs:
+        for idx in range(links_per_song):
+            template, notice = _LINKS[(song.id + idx) % len(_LINKS)]
+            link = sbsong.models.SongLink(song=song, link=template % song.id,
+                                          notice=notice)
+            link.provider, link.embed_link = sbsong.links.classify(link.link)
+            links.append(link)
+    sbsong.models.SongLink.objects.bulk_create(links)
+
+    _create_comments(rnd, gig, songs, users, comments_per_song)
+
+
+def _create_comments(rnd, gig, songs, users, comments_per_song):
+    comments = []
+    for song in songs:
+        # edits change the description, as edited_song() logs them
+        description = song.description
+        for idx in range(comments_per_song):
+            comment_type = rnd.choice(_COMMENT_TYPES)
+            comment = Comment(
+                gig=gig, author=rnd.choice(users), comment_type=comment_type,
+                song=(None if comment_type == Comment.CT_GIG_COMMENT
+                      else song),
+            )
+            if comment_type == Comment.CT_SONG_EDIT:
+                new_description = edit_lyrics(description, every=5,
+                                               seed=idx)
+                comment.text = ''
+                comment.action = '%(who)s (m) edited song %(when)s'
+                comment.description_change = (description,
+                                              new_description)
+                description = new_description
+            else:
+                comment.text = make_lyrics(rnd.randint(20, 400),
+                                           seed=rnd.random())
+                comment.text_html = render_markdown(comment.text)
+            comments.append(comment)
+    rnd.shuffle(comments)
+    # bulk_create() bypasses Comment.save(), which numbers comments
+    first_seq = sbcomment.models.Sequence.objects.next_value(
+        Comment.SEQUENCE, len(comments)
+    )
+    for seq, comment in enumerate(comments, start=first_seq):
+        comment.seq = seq
+    description_changes = [getattr(comment, 'description_change', None)
+                           for comment in comments]
+    comments = create_and_fetch(Comment, comments, gig=gig)
+    changes = []
+    for comment, description_change in zip(comments,
+                                          description_changes):
+        if description_change is None:
+            continue
+        prev, new = description_change
+        changes.append(sbcomment.models.CommentChange(
+            comment=comment, position=0, title='Description',
+            title_translatable=True, prev=prev, new=new,
+            diff=str(textdiff(prev, new)),
+        ))
+    sbcomment.models.CommentChange.objects.bulk_create(changes)
+    # datetime is auto_now, so history is spread over the past
+    # with separate updates
+    now = timezone.now()
+    for idx, comment in enumerate(reversed(comments)):
+        Comment.objects.filter(pk=comment.pk).update(
+            datetime=now - timedelta(minutes=10 * (idx + 1))
+        )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from sbbench.benchmarks import BENCHMARKS
+from songbook import perf
+
+
+def percentile(sorted_values, fraction):
+    idx = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[idx]
+
+
+class Command(BaseCommand):
+    help = ("Run performance benchmarks and report latency percentiles "
+            "and number of SQL queries")
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                            help="Benchmarks to run, one of: %s" %
+                                 ', '.join(BENCHMARKS))
+        parser.add_argument('--repeat', type=int, default=10,
+                            help="Number of runs of every case")
+
+    def handle(self, *args, **options):
+        names = options['benchmarks'] or list(BENCHMARKS)
+        for name in names:
+            if name not in BENCHMARKS:
+                raise CommandError("Unknown benchmark %r" % name)
+        connection_created.connect(perf.instrument_connection,
+                                   dispatch_uid='songbook.perf')
+        for connection in connections.all():
+            perf.instrument_connection(None, connection)
+        for name in names:
+            self.stdout.write(name)
+            for case, func in BENCHMARKS[name]():
+                timings, queries = self._measure(func, options['repeat'])
+                timings.sort()
+                self.stdout.write(
+                    "  %-45s p50 %9.2fms  p90 %9.2fms  p99 %9.2fms  "
+                    "max %9.2fms  %5d queries" % (
+                        case, percentile(timings, 0.5) * 1000,
+                        percentile(timings, 0.9) * 1000,
+                        percentile(timings, 0.99) * 1000, timings[-1] * 1000,
+                        max(queries),
+                    )
+                )
+
+    def _measure(self, func, repeat):
+        timings = []
+        queries = []
+        for i in range(repeat):
+            perf.start()
+            try:
+                func()
+            finally:
+                stats = perf.finish()
+            timings.append(stats.total_time)
+            queries.append(stats.sql_count)
+        return timings, queries
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from sbbench import dataset
+
+
+class Command(BaseCommand):
+    help = ("Generate synthetic gigs, songs, users and comments for "
+            "benchmarks, replacing previously generated ones")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gigs', type=int, default=5)
+        parser.add_argument('--songs', type=int, default=30,
+                            help="Number of songs per gig")
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--parts', type=int, default=4,
+                            help="Number of parts per song")
+        parser.add_argument('--links', type=int, default=2,
+                            help="Number of links per song")
+        parser.add_argument('--comments', type=int, default=20,
+                            help="Number of comments per song")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help="Only remove generated dataset")
+
+    def handle(self, *args, **options):
+        dataset.clear()
+        if options['clear']:
+            return
+        gigs = dataset.generate(
+            gigs=options['gigs'], songs_per_gig=options['songs'],
+            users=options['users'], parts_per_song=options['parts'],
+            links_per_song=options['links'],
+            comments_per_song=options['comments'], seed=options['seed'],
+        )
+        self.stdout.write("Generated %d gigs" % len(gigs))
@@ -1,13 +1,16 @@
-import json
 from datetime import timedelta
 from collections import OrderedDict
 
-from django.db import models
 from django.utils import timezone
 from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils.translation import ugettext_noop as _
 
+from songbook.jinja2env import textdiff
+import sbcomment.jobs
 import sbcomment.models
+import sbgig.models
 import sbsong.models
 
 
@@ -29,18 +32,15 @@ def suggested_song(user, song):
          'prev': '',
          'new': song.description},
     ]
-    _song_changed(song, action, user, changes)
-    sbsong.models.SongWatcher.objects.update_or_create(song=song, user=user)
+    _song_changed(song, action, user, changes, watch=True)
 
 
 def joined_part(user, part, old_performers, *, changed_by=None):
-    sbsong.models.SongWatcher.objects.update_or_create(song=part.song,
-                                                       user=user)
     action = (_('%(who)s (f) joined a song part %(when)s')
               if user.profile.gender == 'f' else
               _('%(who)s (m) joined a song part %(when)s'))
     return _part_participation_base(action, user, part, old_performers,
-                                    changed_by=changed_by)
+                                    changed_by=changed_by, watch=True)
 
 
 def edited_part_participation(user, part, old_performers):
@@ -61,7 +61,7 @@ def left_part(user, part, old_performers, changed_by):
 
 
 def _part_participation_base(action, user, part, old_performers,
-                             changed_by=None):
+                             changed_by=None, watch=False):
     new_performers = part.songperformer_set.all()
     changes = [
         {'title': str(part),
@@ -94,8 +94,8 @@ def _part_participation_base(action, user, part, old_performers,
             'value_translatable': True,
         })
     _song_changed(part.song, action, user, changes,
-                  check_staffed=True, update_readiness=True,
-                  changed_by=changed_by)
+                  prev_staffed=part.song.staffed, changed_by=changed_by,
+                  watch=watch)
 
 
 def added_part(user, song, old_parts):
@@ -120,8 +120,7 @@ def _parts_base(action, user, song, old_parts):
          'prev': '\n'.join(sorted(str(part) for part in old_parts)),
          'new': '\n'.join(sorted(str(part) for part in new_parts))}
     ]
-    _song_changed(song, action, user, changes, check_staffed=True,
-                  update_readiness=True)
+    _song_changed(song, action, user, changes, prev_staffed=song.staffed)
 
 
 def added_link(user, song, old_links):
@@ -199,31 +198,47 @@ def song_comment_written(song, user, text):
     _update_changed_at(song, user)
 
 
-def song_copied(user, song, prev_gig, prev_song_id):
+def song_copied(user, song, prev_song):
+    """
+    Write comment on the song copied from ``prev_song``.
+
+    Unlike other song changes this doesn't touch the song, which must
+    be created with staffing of its own, by ``sbsong.copying``.
+    """
     changes = [
         {'title': _('Gig'),
          'title_translatable': True,
-         'prev': str(prev_gig),
+         'prev': str(prev_song.gig),
          'new': str(song.gig)},
         {'title': _('Song id'),
          'title_translatable': True,
-         'prev': str(prev_song_id),
+         'prev': str(prev_song.id),
          'new': str(song.id)},
     ]
+    if song.staffed != prev_song.staffed:
+        changes.append(_staffed_change(prev_song.staffed, song.staffed))
     action = (_('%(who)s (f) copied song %(when)s')
               if user.profile.gender == 'f' else
               _('%(who)s (m) copied song %(when)s'))
-    _song_changed(song, action, user, changes,
-                  check_staffed=True, update_readiness=True)
+    _create_or_update_comment(
+        gig=song.gig, song=song, author=user, action=action, changes=changes,
+        changed_by='', comment_type=sbcomment.models.Comment.CT_SONG_EDIT
+    )
 
 
-def _song_changed(song, action, user, changes, *,
-                  check_staffed=False, update_readiness=False,
-                  override_gig=None, changed_by=None):
-    if check_staffed:
-        changes = _check_staffed(song, changes)
-    if update_readiness:
-        _update_readiness(song)
+def _song_changed(song, action, user, changes, *, prev_staffed=None,
+                  override_gig=None, changed_by=None, watch=False):
+    # changes of parts and performers pass ``staffed`` of the song
+    # loaded before them, as sbsong.signals have updated it since
+    if prev_staffed is not None:
+        staffed = sbsong.models.Song.objects.filter(
+            pk=song.pk
+        ).values_list('staffed', flat=True).get()
+        if staffed != prev_staffed:
+            changes = changes + [_staffed_change(prev_staffed, staffed)]
+    if watch:
+        sbsong.models.SongWatcher.objects.update_or_create(song=song,
+                                                           user=user)
     changes = [
         change
         for change in changes
@@ -231,44 +246,104 @@ def _song_changed(song, action, user, changes, *,
     ]
     if not changes:
         return
-    info = {'action': action, 'changes': changes}
     if changed_by is not None and changed_by != user:
-        info['changed_by'] = str(changed_by)
+        changed_by_name = str(changed_by)
+    else:
+        changed_by_name = ''
 
+    # the song is marked changed right away, so pages validated by
+    # changed_at don't go stale; only the comment is left to a job
+    _update_changed_at(song, changed_by or user)
     gig = override_gig or song.gig
+    sbcomment.jobs.enqueue(
+        'sbcomment.actions.log_song_change',
+        song_id=song.id, gig_id=gig.id, action=action, user_id=user.id,
+        changes=changes, changed_by=changed_by_name
+    )
+
+
+def log_song_change(song_id, gig_id, action, user_id, changes, changed_by):
+    """
+    Job writing comment on the song change. The change is dropped if
+    the song, the gig or the user is gone by then.
+    """
+    try:
+        song = sbsong.models.Song.objects.get(pk=song_id)
+        gig = sbgig.models.Gig.objects.get(pk=gig_id)
+        user = User.objects.get(pk=user_id)
+    except (sbsong.models.Song.DoesNotExist, sbgig.models.Gig.DoesNotExist,
+            User.DoesNotExist):
+        return
     _create_or_update_comment(
-        gig=gig, song=song, author=user, info=info,
+        gig=gig, song=song, author=user, action=action, changes=changes,
+        changed_by=changed_by,
         comment_type=sbcomment.models.Comment.CT_SONG_EDIT
     )
-    _update_changed_at(song, changed_by or user)
 
 
-def _create_or_update_comment(gig, song, author, info, comment_type):
-    min_datetime = (timezone.now()
-                    - timedelta(seconds=settings.SB_UPDATE_COMMENT_GAP))
-    last_comment = sbcomment.models.Comment.objects.filter(
-        datetime__gt=min_datetime
-    ).order_by('-datetime').first()
-    if (last_comment is not None
-            and last_comment.author == author
-            and last_comment.gig == gig
-            and last_comment.song == song
-            and last_comment.comment_type == comment_type):
-        prev_info = json.loads(last_comment.text)
-        if prev_info['action'] == info['action']:
-            changes = _merge_changes(prev_info['changes'], info['changes'])
+def _create_or_update_comment(gig, song, author, action, changes, changed_by,
+                              comment_type):
+    with transaction.atomic():
+        # comment writers are serialized by the comment sequence, so
+        # concurrent edits can't both miss or both merge into a comment
+        sbcomment.models.Sequence.objects.lock(
+            sbcomment.models.Comment.SEQUENCE
+        )
+        last_comment = _get_mergeable_comment(gig, song, author,
+                                              comment_type)
+        if last_comment is not None and last_comment.action == action:
+            prev_changes = [change.as_dict()
+                            for change in last_comment.changes.all()]
+            changes = _merge_changes(prev_changes, changes)
             if not changes:
                 last_comment.delete()
             else:
-                info['changes'] = changes
-                last_comment.text = json.dumps(info)
+                last_comment.changed_by = changed_by
                 last_comment.save()
+                last_comment.changes.all().delete()
+                _save_changes(last_comment, changes)
             return
 
-    sbcomment.models.Comment.objects.create(
-        gig=gig, song=song, author=author, comment_type=comment_type,
-        text=json.dumps(info)
-    )
+        comment = sbcomment.models.Comment.objects.create(
+            gig=gig, song=song, author=author, comment_type=comment_type,
+            action=action, changed_by=changed_by, text=''
+        )
+        _save_changes(comment, changes)
+
+
+def _get_mergeable_comment(gig, song, author, comment_type):
+    """
+    Return the latest comment of the author on the gig or song made
+    within SB_UPDATE_COMMENT_GAP seconds, whatever others commented since.
+    """
+    min_datetime = (timezone.now()
+                    - timedelta(seconds=settings.SB_UPDATE_COMMENT_GAP))
+    return sbcomment.models.Comment.objects.filter(
+        author=author, gig=gig, song=song, comment_type=comment_type,
+        datetime__gt=min_datetime
+    ).order_by('-datetime').first()
+
+
+def _save_changes(comment, changes):
+    sbcomment.models.CommentChange.objects.bulk_create([
+        sbcomment.models.CommentChange(comment=comment, position=position,
+                                       **change)
+        for position, change in enumerate(_with_diffs(changes))
+    ])
+
+
+def _with_diffs(changes):
+    """
+    Store rendered textdiff along with each change, so reading comments
+    doesn't need to diff again. Values which are translated on display
+    can not be diffed in advance and are left as is.
+    """
+    for change in changes:
+        if change.get('value_translatable'):
+            change.pop('diff', None)
+        else:
+            change['diff'] = str(textdiff(change['prev'], change['new']))
+    return changes
 
 
 def _merge_changes(old_changes, new_changes):
@@ -298,48 +373,18 @@ def _update_changed_at(song, user):
     ).update(last_seen=now)
     song.changed_at = now
     song.changed_by = user
-    song.save()
-
-
-def _check_staffed(song, changes):
-    new_staffed = False
-    parts = song.parts.filter(required=True)
-    new_changes = changes
-    if parts.exists():
-        new_staffed = not (
-            parts.annotate(num_perf=models.Count('songperformer'))
-                 .filter(num_perf=0).exists()
-        )
-    if song.staffed != new_staffed:
-        bools_txt = {True: _('Yes'),
-                     False: _('No')}
-        new_changes = changes[:]
-        new_changes.append(
-            {'title': _('Song staffed'),
-             'title_translatable': True,
-             'prev': bools_txt[song.staffed],
-             'new': bools_txt[new_staffed],
-             'value_translatable': True}
-        )
-        song.staffed = new_staffed
-        song.save()
-    return new_changes
+    # staffed and readiness are kept up to date by sbsong.signals
+    song.save(update_fields=['changed_at', 'changed_by'])
 
 
-def _update_readiness(song):
-    parts_qs = song.parts.filter(required=True)
-    num_parts = parts_qs.count()
-    if num_parts == 0:
-        new_readiness = 0
-    else:
-        all_readiness = parts_qs.annotate(
-            best_perf=models.Max('songperformer__readiness')
-        ).values_list('best_perf', flat=True)
-        new_readiness = int(sum(r for r in all_readiness if r) / num_parts)
-    if song.readiness == new_readiness:
-        return
-    song.readiness = new_readiness
-    song.save()
+def _staffed_change(prev, new):
+    bools_txt = {True: _('Yes'),
+                 False: _('No')}
+    return {'title': _('Song staffed'),
+            'title_translatable': True,
+            'prev': bools_txt[prev],
+            'new': bools_txt[new],
+            'value_translatable': True}
 
 
 def edited_gig(user, gig):
@@ -364,9 +409,8 @@ def edited_gig(user, gig):
     action = (_('%(who)s (f) edited gig %(when)s')
               if user.profile.gender == 'f' else
               _('%(who)s (m) edited gig %(when)s'))
-    info = {'action': action, 'changes': changes}
-    sbcomment.models.Comment.objects.create(
-        gig=gig, song=None, author=user,
-        text=json.dumps(info),
+    comment = sbcomment.models.Comment.objects.create(
+        gig=gig, song=None, author=user, action=action, text='',
         comment_type=sbcomment.models.Comment.CT_GIG_EDIT,
     )
+    _save_changes(comment, changes)
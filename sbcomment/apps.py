@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class SbcommentConfig(AppConfig):
+    name = 'sbcomment'
+
+    def ready(self):
+        import sbcomment.signals  # noqa
@@ -1,12 +1,34 @@
-import json
+"""
+Feed of comments of a gig.
+
+Rendered feeds are cached per gig id, language and timezone, and polls
+are answered by ETag and Last-Modified of the cached feed, mostly with
+304 and without queries; gig ids of slugs are cached as well. A cached
+feed is dropped by ``sbcomment.signals`` when comments are added, when
+published comments change, and when gig or song titles change. It
+expires by itself once a comment becomes older than
+SB_UPDATE_COMMENT_GAP and joins the feed.
+"""
+from calendar import timegm
+from collections import namedtuple
 from datetime import timedelta
+import hashlib
+import uuid
 
 from django.shortcuts import get_object_or_404
 from django.contrib.syndication.views import Feed
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Max, Min, When
+from django.http import HttpResponse
+from django.utils.http import http_date, quote_etag
 from django.utils.translation import ugettext_noop as _, ugettext
 from django.utils import timezone
+from django.utils import translation
+from django.views.decorators.http import condition
 
+from songbook import perf
 from songbook.jinja2env import format_datetime
 import sbgig.models
 import sbcomment.models
@@ -14,26 +36,17 @@ import sbcomment.models
 
 class GigCommentsFeed(Feed):
     description_template = "sbcomment/gig_feed_desc.html"
-    EDIT_COMMENTS = set((
-        sbcomment.models.Comment.CT_SONG_EDIT,
-        sbcomment.models.Comment.CT_GIG_EDIT,
-    ))
 
-    def get_object(self, request, slug):
-        return get_object_or_404(sbgig.models.Gig, slug=slug)
+    def get_object(self, request, slug, cutoff=None):
+        gig = get_object_or_404(sbgig.models.Gig, slug=slug)
+        gig.feed_cutoff = cutoff or get_cutoff()
+        return gig
 
     def items(self, obj):
-        max_datetime = (timezone.now()
-                        - timedelta(seconds=settings.SB_UPDATE_COMMENT_GAP))
-        comments = obj.comments.filter(datetime__lte=max_datetime)
-        comments = comments[:settings.SB_COMMENTS_ON_PAGE]
-        for comment in comments:
-            comment.data = None
-            comment.is_edit = False
-            if comment.comment_type in self.EDIT_COMMENTS:
-                comment.data = json.loads(comment.text)
-                comment.is_edit = True
-        return comments
+        # comments are only published once they can't be merged with
+        comments = obj.comments.filter(datetime__lte=obj.feed_cutoff) \
+                               .prefetch_related('changes')
+        return comments[:settings.SB_COMMENTS_ON_PAGE]
 
     def title(self, obj):
         return ugettext("%(gig)s: comments and changes") % {'gig': obj.title}
@@ -45,8 +58,8 @@ class GigCommentsFeed(Feed):
         return self.title(obj)
 
     def item_title(self, item):
-        if item.is_edit:
-            action = item.data['action']
+        if item.is_edit():
+            action = item.action
         elif item.comment_type == sbcomment.models.Comment.CT_SONG_COMMENT:
             action = (_('%(who)s (f) commented song %(when)s')
                       if item.author.profile.gender == 'f' else
@@ -57,9 +70,9 @@ class GigCommentsFeed(Feed):
                       _('%(who)s (m) commented gig %(when)s'))
         action = ugettext(action) % dict(who=item.author,
                                          when=format_datetime(item.datetime))
-        if item.is_edit and 'changed_by' in item.data:
+        if item.is_edit() and item.changed_by:
             action = ugettext("%(action)s / changes made by %(who)s") % \
-                     dict(action=action, who=item.data['changed_by'])
+                     dict(action=action, who=item.changed_by)
         if item.song:
             return ugettext("%(song)s: %(action)s") % \
                             dict(song=item.song.title, action=action)
@@ -82,3 +95,133 @@ class GigCommentsFeed(Feed):
 
     def item_guid(self, item):
         return str(item.id)
+
+
+_feed = GigCommentsFeed()
+
+FeedEntry = namedtuple('FeedEntry', ['content', 'content_type', 'etag',
+                                     'last_modified', 'valid_until'])
+
+
+def get_cutoff():
+    """
+    Return the time comments must be older than to be published.
+    """
+    return (timezone.now()
+            - timedelta(seconds=settings.SB_UPDATE_COMMENT_GAP))
+
+
+def _gig_id_key(slug):
+    return 'sbcomment:gig-feed-gig-id:%s' % slug
+
+
+def _version_key(gig_id):
+    return 'sbcomment:gig-feed-version:%s' % gig_id
+
+
+def _cache_key(gig_id, version):
+    return 'sbcomment:gig-feed:%s:%s:%s:%s' % (
+        gig_id, version, translation.get_language(),
+        timezone.get_current_timezone_name()
+    )
+
+
+def _get_gig_id(slug):
+    key = _gig_id_key(slug)
+    gig_id = cache.get(key)
+    if gig_id is None:
+        gig = get_object_or_404(sbgig.models.Gig.objects.only('id'),
+                                slug=slug)
+        gig_id = gig.id
+        cache.set(key, gig_id, settings.SB_GIG_FEED_CACHE_TIMEOUT)
+    return gig_id
+
+
+def _get_version(gig_id):
+    key = _version_key(gig_id)
+    version = cache.get(key)
+    if version is None:
+        # feeds cached under a lost version must not be found again
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _get_entry(request, slug):
+    # looked up once for validators and the view
+    entries = request.__dict__.setdefault('_gig_feed_entries', {})
+    if slug not in entries:
+        gig_id = _get_gig_id(slug)
+        entry = cache.get(_cache_key(gig_id, _get_version(gig_id)))
+        if (entry is not None and entry.valid_until is not None
+                and entry.valid_until <= timezone.now()):
+            entry = None
+        perf.record_cache('gig_feed', entry is not None)
+        entries[slug] = entry
+    return entries[slug]
+
+
+def _build_entry(request, slug):
+    gig_id = _get_gig_id(slug)
+    version = _get_version(gig_id)
+    cutoff = get_cutoff()
+    response = _feed(request, slug=slug, cutoff=cutoff)
+    comments = sbcomment.models.Comment.objects.filter(gig=gig_id)
+    state = comments.aggregate(
+        last_modified=Max(Case(When(datetime__lte=cutoff, then='datetime'),
+                               output_field=DateTimeField())),
+        next_comment_at=Min(Case(When(datetime__gt=cutoff, then='datetime'),
+                                 output_field=DateTimeField())),
+    )
+    valid_until = None
+    if state['next_comment_at'] is not None:
+        valid_until = (state['next_comment_at']
+                       + timedelta(seconds=settings.SB_UPDATE_COMMENT_GAP))
+    entry = FeedEntry(
+        content=response.content, content_type=response['Content-Type'],
+        etag=hashlib.sha1(response.content).hexdigest(),
+        last_modified=state['last_modified'], valid_until=valid_until,
+    )
+    cache.set(_cache_key(gig_id, version), entry,
+              settings.SB_GIG_FEED_CACHE_TIMEOUT)
+    return entry
+
+
+def _feed_etag(request, slug):
+    entry = _get_entry(request, slug)
+    return entry.etag if entry is not None else None
+
+
+def _feed_last_modified(request, slug):
+    entry = _get_entry(request, slug)
+    return entry.last_modified if entry is not None else None
+
+
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def gig_comments_feed(request, slug):
+    entry = _get_entry(request, slug)
+    if entry is None:
+        entry = _build_entry(request, slug)
+    response = HttpResponse(entry.content, content_type=entry.content_type)
+    response['ETag'] = quote_etag(entry.etag)
+    if entry.last_modified is not None:
+        response['Last-Modified'] = http_date(
+            timegm(entry.last_modified.utctimetuple())
+        )
+    return response
+
+
+def invalidate(gig_id):
+    key = _version_key(gig_id)
+    cache.set(key, uuid.uuid4().hex, None)
+    # other requests may cache the old feed until the change is committed
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def forget_slug(slug):
+    """
+    Drop the cached gig id of a slug which was changed or deleted.
+    """
+    key = _gig_id_key(slug)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,145 @@
+"""
+Queue of jobs doing bookkeeping which follows writes.
+
+Change comments of songs are written by jobs, so requests which change
+a song don't wait for them; what pages are validated by, such as
+``changed_at`` of the song, is still updated by the request. A job is
+a ``Job`` row created in the transaction of the write, so it's neither
+lost nor run for a write which was rolled back. Jobs are claimed in
+batches and each one runs in a transaction of its own which also
+deletes it: a job either takes effect as a whole or is retried later
+as a whole, and its function must cope with the data current at the
+time it runs.
+
+How jobs are run depends on ``SB_JOBS_MODE``:
+
+``'sync'``
+    immediately within the calling transaction, without a queue; this
+    is the default, so a page reloaded after a change shows its comment;
+``'thread'``
+    by a thread pool of the process once the transaction commits,
+    which suits a single process install;
+``'worker'``
+    by ``manage.py run_jobs`` only.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+import sbcomment.models
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class _ClaimLost(Exception):
+    pass
+
+
+def enqueue(func, **kwargs):
+    """
+    Call function with dotted path ``func`` with ``kwargs`` after
+    the current transaction. Arguments must be serializable to JSON.
+    """
+    if settings.SB_JOBS_MODE == 'sync':
+        import_string(func)(**kwargs)
+        return
+    sbcomment.models.Job.objects.create(
+        func=func, kwargs=json.dumps(kwargs), run_after=timezone.now()
+    )
+    if settings.SB_JOBS_MODE == 'thread':
+        transaction.on_commit(_wake_pool)
+
+
+def run_pending(batch_size=None):
+    """
+    Run due jobs batch by batch until there are none left.
+    Return the number of jobs run, failed ones included.
+    """
+    batch_size = batch_size or settings.SB_JOBS_BATCH_SIZE
+    done = 0
+    while True:
+        jobs = _claim(batch_size)
+        if not jobs:
+            return done
+        for job in jobs:
+            _run(job)
+        done += len(jobs)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = sbcomment.models.Job.objects.filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+        run_after__lte=now, failed=False
+    )
+    job_ids = list(due.order_by('id').values_list('id', flat=True)
+                   [:batch_size])
+    if not job_ids:
+        return []
+    # jobs claimed by another worker in between are left out by
+    # the conditions repeated in the update
+    due.filter(id__in=job_ids).update(
+        claimed_by=token,
+        claimed_until=now + timedelta(seconds=settings.SB_JOBS_CLAIM_TIMEOUT)
+    )
+    return list(sbcomment.models.Job.objects.filter(claimed_by=token)
+                .order_by('id'))
+
+
+def _run(job):
+    claimed = sbcomment.models.Job.objects.filter(pk=job.pk,
+                                                  claimed_by=job.claimed_by)
+    try:
+        with transaction.atomic():
+            import_string(job.func)(**json.loads(job.kwargs))
+            deleted, _ = claimed.delete()
+            if not deleted:
+                # the claim timed out and another worker runs the job
+                raise _ClaimLost
+    except _ClaimLost:
+        return
+    except Exception as e:
+        logger.exception("Job %s failed", job)
+        attempts = job.attempts + 1
+        delay = settings.SB_JOBS_RETRY_DELAY * 2 ** job.attempts
+        claimed.update(
+            attempts=attempts,
+            failed=attempts >= settings.SB_JOBS_MAX_ATTEMPTS,
+            last_error=repr(e),
+            run_after=timezone.now() + timedelta(seconds=delay),
+            claimed_by='', claimed_until=None
+        )
+
+
+def _wake_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SB_JOBS_THREADS
+            )
+    _executor.submit(_run_in_thread)
+
+
+def _run_in_thread():
+    try:
+        # jobs due for a retry are run along with new ones
+        run_pending()
+    except Exception:
+        logger.exception("Running jobs failed")
+    finally:
+        connections.close_all()
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from sbcomment import jobs
+
+
+class Command(BaseCommand):
+    help = ("Run queued bookkeeping jobs as they come, "
+            "for SB_JOBS_MODE = 'worker'")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Run jobs which are due and exit")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Number of jobs claimed at once")
+
+    def handle(self, *args, **options):
+        while True:
+            num_run = jobs.run_pending(options['batch_size'])
+            if options['once']:
+                self.stdout.write("%d jobs run" % num_run)
+                return
+            if not num_run:
+                time.sleep(settings.SB_JOBS_POLL_INTERVAL)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+EDIT_COMMENTS = ('song_changed', 'gig_changed')
+
+CHANGE_FIELDS = ('title', 'title_translatable', 'prev', 'new',
+                 'value_translatable', 'diff')
+
+
+def json_to_changes(apps, schema_editor):
+    Comment = apps.get_model('sbcomment', 'Comment')
+    CommentChange = apps.get_model('sbcomment', 'CommentChange')
+    edit_comments = Comment.objects.filter(comment_type__in=EDIT_COMMENTS)
+    for comment_id, text in edit_comments.values_list('id', 'text'):
+        info = json.loads(text)
+        CommentChange.objects.bulk_create([
+            CommentChange(comment_id=comment_id, position=position,
+                          **{field: change[field] for field in CHANGE_FIELDS
+                             if field in change})
+            for position, change in enumerate(info['changes'])
+        ])
+        # update() doesn't touch auto_now datetime, unlike save()
+        Comment.objects.filter(pk=comment_id).update(
+            text='', action=info['action'],
+            changed_by=info.get('changed_by', '')
+        )
+
+
+def changes_to_json(apps, schema_editor):
+    Comment = apps.get_model('sbcomment', 'Comment')
+    CommentChange = apps.get_model('sbcomment', 'CommentChange')
+    edit_comments = Comment.objects.filter(comment_type__in=EDIT_COMMENTS)
+    for comment in edit_comments.only('id', 'action', 'changed_by'):
+        changes = []
+        for change in CommentChange.objects.filter(comment_id=comment.id) \
+                                           .order_by('position'):
+            change = {field: getattr(change, field)
+                      for field in CHANGE_FIELDS}
+            if change['diff'] is None:
+                del change['diff']
+            changes.append(change)
+        info = {'action': comment.action, 'changes': changes}
+        if comment.changed_by:
+            info['changed_by'] = comment.changed_by
+        Comment.objects.filter(pk=comment.id).update(text=json.dumps(info))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbcomment', '0002_comment_text_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='action',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='changed_by',
+            field=models.CharField(blank=True, max_length=150),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='CommentChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('title', models.CharField(max_length=500)),
+                ('title_translatable', models.BooleanField(default=False)),
+                ('prev', models.TextField(blank=True)),
+                ('new', models.TextField(blank=True)),
+                ('value_translatable', models.BooleanField(default=False)),
+                ('diff', models.TextField(blank=True, null=True)),
+                ('comment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='sbcomment.Comment')),
+            ],
+            options={
+                'ordering': ['comment', 'position'],
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='commentchange',
+            index_together=set([('title', 'comment')]),
+        ),
+
+        migrations.RunPython(json_to_changes, changes_to_json),
+    ]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def number_comments(apps, schema_editor):
+    Comment = apps.get_model('sbcomment', 'Comment')
+    Sequence = apps.get_model('sbcomment', 'Sequence')
+    seq = 0
+    comment_ids = Comment.objects.order_by('datetime', 'id')
+    for seq, comment_id in enumerate(comment_ids.values_list('id', flat=True),
+                                     start=1):
+        Comment.objects.filter(pk=comment_id).update(seq=seq)
+    Sequence.objects.create(name='comment', value=seq)
+
+
+def delete_sequence(apps, schema_editor):
+    Sequence = apps.get_model('sbcomment', 'Sequence')
+    Sequence.objects.filter(name='comment').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbcomment', '0003_commentchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='seq',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+
+        migrations.RunPython(number_comments, delete_sequence),
+
+        migrations.AlterField(
+            model_name='comment',
+            name='seq',
+            field=models.BigIntegerField(editable=False, unique=True),
+        ),
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ['-seq']},
+        ),
+        migrations.AlterIndexTogether(
+            name='comment',
+            index_together=set([('author', 'datetime'), ('gig', 'datetime'), ('song', 'datetime'), ('gig', 'comment_type', 'seq'), ('song', 'seq')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbcomment', '0004_comment_seq'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='comment',
+            index_together=set([('author', 'datetime'), ('gig', 'datetime'), ('song', 'datetime'), ('gig', 'comment_type', 'seq'), ('song', 'seq'), ('author', 'gig', 'song', 'comment_type', 'datetime')]),
+        ),
+    ]
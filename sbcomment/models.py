@@ -1,6 +1,68 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
+from songbook.markup import MarkdownFieldsMixin
+
+
+class SequenceManager(models.Manager):
+    def next_value(self, name, count=1):
+        """
+        Reserve ``count`` consecutive values of the named sequence
+        and return the first of them.
+
+        The row of the sequence stays locked until the surrounding
+        transaction ends, so values become visible in increasing order.
+        """
+        with transaction.atomic():
+            updated = self.filter(name=name).update(
+                value=models.F('value') + count
+            )
+            if not updated:
+                self.create(name=name, value=count)
+            return self.get(name=name).value - count + 1
+
+    def lock(self, name):
+        """
+        Lock the named sequence until the surrounding transaction ends,
+        without taking a value. This serializes transactions using it.
+        """
+        self.filter(name=name).update(value=models.F('value'))
+
+
+class Sequence(models.Model):
+    """
+    Counter issuing monotonic values, a portable stand-in for database
+    sequences.
+    """
+    objects = SequenceManager()
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(null=False, default=0)
+
+
+class Job(models.Model):
+    """
+    Deferred call of a function, see ``sbcomment.jobs``.
+
+    Done jobs are deleted, failed ones are retried after ``run_after``
+    until they run out of attempts.
+    """
+    func = models.CharField(max_length=200, null=False, blank=False)
+    # JSON object of keyword arguments
+    kwargs = models.TextField(null=False, blank=True, default='{}')
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(null=False, db_index=True)
+    attempts = models.PositiveSmallIntegerField(null=False, default=0)
+    failed = models.BooleanField(null=False, default=False)
+    last_error = models.TextField(null=False, blank=True, default='')
+    # a worker which claimed the job, and until when it may run it
+    claimed_by = models.CharField(max_length=32, null=False, blank=True,
+                                  default='', db_index=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '%s #%s' % (self.func, self.pk)
+
 
 class CommentManager(models.Manager):
     def get_queryset(self):
@@ -8,7 +70,7 @@ class CommentManager(models.Manager):
         return qs.select_related('song', 'author', 'gig')
 
 
-class Comment(models.Model):
+class Comment(MarkdownFieldsMixin, models.Model):
     objects = CommentManager()
 
     CT_SONG_COMMENT = 'song_comment'
@@ -23,6 +85,8 @@ class Comment(models.Model):
     )
     GIG_ONLY_COMMENTS = (CT_GIG_COMMENT, CT_GIG_EDIT)
 
+    SEQUENCE = 'comment'
+
     gig = models.ForeignKey('sbgig.Gig', on_delete=models.CASCADE,
                             blank=False, related_name='comments')
     song = models.ForeignKey('sbsong.Song', on_delete=models.CASCADE,
@@ -33,12 +97,88 @@ class Comment(models.Model):
                                null=True, blank=True,
                                related_name='comments')
     datetime = models.DateTimeField(auto_now=True)
-    text = models.TextField(null=False, blank=False)
+    text = models.TextField(null=False, blank=True)
+    text_html = models.TextField(null=True, blank=True, editable=False)
+    # edit comments have empty text, what was changed is kept
+    # in CommentChange rows
+    action = models.CharField(max_length=200, null=False, blank=True)
+    changed_by = models.CharField(max_length=150, null=False, blank=True)
+    # position in the order of last changes, the comment gets a new one
+    # every time it's saved, see sbcomment.paging
+    seq = models.BigIntegerField(null=False, unique=True, editable=False)
 
     class Meta:
-        ordering = ['-datetime']
+        ordering = ['-seq']
         index_together = [
             ['author', 'datetime'],
             ['gig', 'datetime'],
             ['song', 'datetime'],
+            ['gig', 'comment_type', 'seq'],
+            ['song', 'seq'],
+            ['author', 'gig', 'song', 'comment_type', 'datetime'],
         ]
+
+    def save(self, *args, **kwargs):
+        self.seq = Sequence.objects.next_value(self.SEQUENCE)
+        super(Comment, self).save(*args, **kwargs)
+
+    def get_markdown_fields(self):
+        if self.comment_type in (self.CT_SONG_EDIT, self.CT_GIG_EDIT):
+            return ()
+        return ('text', )
+
+    def is_edit(self):
+        return self.comment_type in (self.CT_SONG_EDIT, self.CT_GIG_EDIT)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'seq': self.seq,
+            'gig': self.gig_id,
+            'song': self.song_id,
+            'comment_type': self.comment_type,
+            'author': self.author.username if self.author else None,
+            'datetime': self.datetime,
+            'text': self.text,
+            'text_html': self.text_html,
+            'action': self.action,
+            'changed_by': self.changed_by,
+            'changes': [change.as_dict() for change in self.changes.all()],
+        }
+
+
+class CommentChange(models.Model):
+    """
+    Change of one field (or another aspect of a song or gig) made
+    by an edit comment.
+
+    ``title`` and, if ``value_translatable`` is set, ``prev`` and ``new``
+    are message ids which are translated on display. ``diff`` keeps
+    rendered textdiff of values which are not translated.
+    """
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE,
+                                null=False, blank=False,
+                                related_name='changes')
+    position = models.PositiveSmallIntegerField(null=False, blank=False)
+    title = models.CharField(max_length=500, null=False, blank=False)
+    title_translatable = models.BooleanField(null=False, default=False)
+    prev = models.TextField(null=False, blank=True)
+    new = models.TextField(null=False, blank=True)
+    value_translatable = models.BooleanField(null=False, default=False)
+    diff = models.TextField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['comment', 'position']
+        index_together = [
+            ['title', 'comment'],
+        ]
+
+    def as_dict(self):
+        return {
+            'title': self.title,
+            'title_translatable': self.title_translatable,
+            'prev': self.prev,
+            'new': self.new,
+            'value_translatable': self.value_translatable,
+            'diff': self.diff,
+        }
@@ -0,0 +1,103 @@
+"""
+Notification of new comments.
+
+Long-polling views wait on a ``Notifier`` instead of querying the
+database in a loop. Its notifications don't cross process boundaries,
+so ``notify()`` also changes a version of each key in the cache, which
+waiters check every ``SB_COMMENTS_WAIT_RECHECK`` seconds; the database
+is only queried again once either of them changed. With a cache
+shared by processes, such as memcached, comments saved by another
+process are noticed within the recheck interval, with a per-process
+cache only when the wait times out and the page waits again.
+"""
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+class Notifier:
+    """
+    Versioned wakeup of threads waiting for changes of some keys.
+
+    A waiter reads the version of a key *before* looking for changes,
+    so a notification arriving in between isn't lost:
+
+    >>> notifier = Notifier()
+    >>> version = notifier.version('key')
+    >>> notifier.notify('key')
+    >>> notifier.wait('key', version, timeout=0)
+    True
+    >>> notifier.wait('key', notifier.version('key'), timeout=0)
+    False
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = {}
+
+    def version(self, key):
+        with self._condition:
+            return self._versions.get(key, 0)
+
+    def notify(self, *keys):
+        with self._condition:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._condition.notify_all()
+
+    def wait(self, key, version, timeout):
+        """
+        Wait until the key is notified past ``version`` or ``timeout``
+        seconds pass. Return True if it was notified.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._versions.get(key, 0) == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+
+notifier = Notifier()
+
+
+def notify(*keys):
+    """
+    Wake waiters for the keys in this process and in others.
+    """
+    cache.set_many({_shared_key(key): uuid.uuid4().hex for key in keys},
+                   None)
+    notifier.notify(*keys)
+
+
+def shared_version(key):
+    """
+    Return version of the key changed by ``notify()`` in any process
+    sharing the cache, None if it's not known.
+    """
+    return cache.get(_shared_key(key))
+
+
+def _shared_key(key):
+    return 'sbcomment:comments-version:%s:%s' % key
+
+
+def gig_key(gig_id):
+    return ('gig', gig_id)
+
+
+def song_key(song_id):
+    return ('song', song_id)
+
+
+def comment_keys(comment):
+    """
+    Return keys notified when the comment is saved.
+    """
+    keys = [gig_key(comment.gig_id)]
+    if comment.song_id is not None:
+        keys.append(song_key(comment.song_id))
+    return keys
@@ -0,0 +1,48 @@
+"""
+Keyset pagination of comment streams.
+
+Comments are paged by ``Comment.seq`` rather than by offset or by
+``datetime``. A comment gets a new ``seq`` whenever it's saved (as when
+an edit is merged into it), so it can only move to the head of the
+stream: pages of comments after a seq don't miss it, but a comment
+already read comes again with its new content. Clients therefore
+replace comments they have by id, as ``showNewComments`` of sb.js does.
+Every page is read from an index in time proportional to its size,
+however deep it is.
+"""
+import sbcomment.models
+
+
+def get_page(gig, song=None, *, before=None, after=None, limit):
+    """
+    Return up to ``limit`` comments of the song, or gig-only comments of
+    the gig if ``song`` is None, newest first.
+
+    With ``before`` these are the newest comments older than that seq.
+    With ``after`` these are the *oldest* comments newer than that seq,
+    so a client catching up doesn't skip any.
+    """
+    if song is not None:
+        querysets = [song.comments.all()]
+    else:
+        # one query per type keeps each of them on the
+        # (gig, comment_type, seq) index
+        querysets = [
+            gig.comments.filter(comment_type=comment_type)
+            for comment_type in sbcomment.models.Comment.GIG_ONLY_COMMENTS
+        ]
+    comments = []
+    for qs in querysets:
+        qs = qs.prefetch_related('changes')
+        if after is not None:
+            qs = qs.filter(seq__gt=after).order_by('seq')
+        else:
+            if before is not None:
+                qs = qs.filter(seq__lt=before)
+            qs = qs.order_by('-seq')
+        comments.extend(qs[:limit])
+    comments.sort(key=lambda comment: comment.seq, reverse=(after is None))
+    comments = comments[:limit]
+    if after is not None:
+        comments.reverse()
+    return comments
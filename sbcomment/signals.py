@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+import sbcomment.feeds
+import sbcomment.models
+import sbcomment.notifier
+import sbgig.models
+import sbsong.models
+
+
+def _last_saved(instance):
+    # post_save is sent before DirtyFieldsMixin records the saved values
+    if instance._saved_values is not None:
+        return instance._saved_values
+    return instance._pristine
+
+
+@receiver(post_save, sender=sbcomment.models.Comment)
+def comment_saved(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    keys = sbcomment.notifier.comment_keys(instance)
+    # waiters query the database, so they are woken once it's committed
+    transaction.on_commit(lambda: sbcomment.notifier.notify(*keys))
+
+
+@receiver(pre_save, sender=sbcomment.models.Comment)
+def comment_saving(sender, instance, raw, **kwargs):
+    # datetime is not yet set by this save; cached feeds expire by
+    # themselves when comments they know of are published, so only new
+    # comments and published ones, which leave the feed when saved,
+    # drop them
+    if raw:
+        return
+    if (instance._state.adding
+            or instance.datetime <= sbcomment.feeds.get_cutoff()):
+        sbcomment.feeds.invalidate(instance.gig_id)
+
+
+@receiver(post_delete, sender=sbcomment.models.Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.datetime <= sbcomment.feeds.get_cutoff():
+        sbcomment.feeds.invalidate(instance.gig_id)
+
+
+@receiver([post_save, post_delete], sender=sbgig.models.Gig)
+def gig_changed(sender, instance, **kwargs):
+    sbcomment.feeds.invalidate(instance.id)
+    old_slug = _last_saved(instance).get('slug')
+    if old_slug is not None and old_slug != instance.slug:
+        sbcomment.feeds.forget_slug(old_slug)
+
+
+@receiver(post_delete, sender=sbgig.models.Gig)
+def gig_deleted(sender, instance, **kwargs):
+    sbcomment.feeds.forget_slug(instance.slug)
+
+
+@receiver(post_save, sender=sbsong.models.Song)
+def song_saved(sender, instance, created, raw, update_fields, **kwargs):
+    # feed items are titled by songs
+    if created or raw or instance.gig_id is None:
+        return
+    if update_fields is not None and 'title' not in update_fields:
+        return
+    old_title = _last_saved(instance).get('title')
+    if old_title is not None and old_title != instance.title:
+        sbcomment.feeds.invalidate(instance.gig_id)
@@ -0,0 +1,204 @@
+from datetime import date, timedelta
+import threading
+import unittest
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+import sbcomment.actions
+import sbcomment.jobs
+import sbcomment.models
+import sbcomment.notifier
+import sbcomment.paging
+import sbgig.models
+import sbsong.models
+import sbuser.models
+
+
+class NotifierTestCase(unittest.TestCase):
+    def test_notifier_wakes_waiter(self):
+        notifier = sbcomment.notifier.Notifier()
+        key = sbcomment.notifier.gig_key(1)
+        version = notifier.version(key)
+        notifying = threading.Thread(target=notifier.notify, args=[key])
+        notifying.start()
+        self.assertTrue(notifier.wait(key, version, timeout=5))
+        notifying.join()
+
+    def test_notify_reaches_other_processes_through_cache(self):
+        key = sbcomment.notifier.song_key(1)
+        version = sbcomment.notifier.shared_version(key)
+        sbcomment.notifier.notify(key)
+        self.assertNotEqual(sbcomment.notifier.shared_version(key), version)
+
+
+class CommentPagingTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='user')
+        cls.gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                                  date=date.today())
+        cls.song = sbsong.models.Song.objects.create(
+            gig=cls.gig, title='Song', suggested_by=user, changed_by=user
+        )
+        # song comments are left out of pages of the gig
+        for idx in range(10):
+            sbcomment.models.Comment.objects.create(
+                gig=cls.gig, author=user, text="Gig %d" % idx,
+                comment_type=sbcomment.models.Comment.CT_GIG_COMMENT
+            )
+            sbcomment.models.Comment.objects.create(
+                gig=cls.gig, song=cls.song, author=user, text="Song %d" % idx,
+                comment_type=sbcomment.models.Comment.CT_SONG_COMMENT
+            )
+
+    def test_pages_cover_stream_once(self):
+        expected = list(self.gig.comments.filter(
+            comment_type__in=sbcomment.models.Comment.GIG_ONLY_COMMENTS
+        ).values_list('id', flat=True))
+        seen = []
+        page = sbcomment.paging.get_page(self.gig, limit=3)
+        while page:
+            seen.extend(comment.id for comment in page)
+            page = sbcomment.paging.get_page(self.gig, before=page[-1].seq,
+                                             limit=3)
+        self.assertEqual(len(expected), 10)
+        self.assertEqual(seen, expected)
+
+    def test_saved_comment_moves_to_head(self):
+        [oldest, newest] = [self.song.comments.last(),
+                            self.song.comments.first()]
+        oldest.save()
+        page = sbcomment.paging.get_page(self.gig, self.song,
+                                         after=newest.seq, limit=5)
+        self.assertEqual([comment.id for comment in page], [oldest.id])
+
+
+class CommentCoalescingTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        [cls.user, cls.other_user] = [User.objects.create(username=username)
+                                      for username in ('user', 'other')]
+        cls.gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                                  date=date.today())
+        cls.song = sbsong.models.Song.objects.create(
+            gig=cls.gig, title='Song', suggested_by=cls.user,
+            changed_by=cls.user
+        )
+
+    def edit(self, prev, new):
+        sbcomment.actions._create_or_update_comment(
+            gig=self.gig, song=self.song, author=self.user, action='edited',
+            changes=[{'title': 'Title', 'title_translatable': False,
+                      'prev': prev, 'new': new}],
+            changed_by='',
+            comment_type=sbcomment.models.Comment.CT_SONG_EDIT
+        )
+
+    def test_edits_merge_across_comments_of_others(self):
+        self.edit('a', 'b')
+        sbcomment.actions.song_comment_written(self.song, self.other_user,
+                                               "Hi")
+        self.edit('b', 'c')
+        [edit] = self.song.comments.filter(author=self.user)
+        self.assertEqual([(change.prev, change.new)
+                          for change in edit.changes.all()], [('a', 'c')])
+        self.assertEqual(self.song.comments.first(), edit)
+
+
+class GigFeedCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        sbuser.models.Profile.objects.create(user=cls.user)
+        cls.gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                                  date=date.today())
+        comment = sbcomment.models.Comment.objects.create(
+            gig=cls.gig, author=cls.user, text="Hello",
+            comment_type=sbcomment.models.Comment.CT_GIG_COMMENT
+        )
+        sbcomment.models.Comment.objects.filter(pk=comment.pk).update(
+            datetime=timezone.now() - timedelta(hours=2)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('sbcomment:view-gig', args=[self.gig.slug])
+
+    def test_polls_are_answered_from_cache(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        comment = sbcomment.models.Comment.objects.create(
+            gig=self.gig, author=self.user, text="Hi",
+            comment_type=sbcomment.models.Comment.CT_GIG_COMMENT
+        )
+        sbcomment.models.Comment.objects.filter(pk=comment.pk).update(
+            datetime=timezone.now() - timedelta(hours=1)
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_renamed_gig_leaves_old_slug(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.gig.slug = 'renamed'
+        self.gig.save()
+        response = self.client.get(
+            reverse('sbcomment:view-gig', args=['renamed'])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+def _failing_job():
+    raise ValueError("Job failed")
+
+
+@override_settings(SB_JOBS_MODE='worker')
+class JobQueueTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        sbuser.models.Profile.objects.create(user=cls.user)
+        gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                              date=date.today())
+        cls.song = sbsong.models.Song.objects.create(
+            gig=gig, title='Song', suggested_by=cls.user, changed_by=cls.user
+        )
+
+    def test_song_change_is_logged_by_job(self):
+        # the song is updated in place, so the value is kept aside
+        changed_at = self.song.changed_at
+        old_links = list(self.song.links.all())
+        sbsong.models.SongLink.objects.create(
+            song=self.song, link='http://example.com/demo', notice='Demo'
+        )
+        sbcomment.actions.added_link(self.user, self.song, old_links)
+        edits = self.song.comments.filter(
+            author=self.user,
+            comment_type=sbcomment.models.Comment.CT_SONG_EDIT
+        )
+        self.assertFalse(edits.exists())
+        self.assertGreater(
+            sbsong.models.Song.objects.get(pk=self.song.pk).changed_at,
+            changed_at
+        )
+        self.assertEqual(sbcomment.jobs.run_pending(), 1)
+        self.assertEqual(edits.count(), 1)
+        self.assertFalse(sbcomment.models.Job.objects.exists())
+
+    def test_failed_job_is_retried_later(self):
+        sbcomment.jobs.enqueue('sbcomment.tests._failing_job')
+        with self.assertLogs('sbcomment.jobs', 'ERROR'):
+            self.assertEqual(sbcomment.jobs.run_pending(), 1)
+        job = sbcomment.models.Job.objects.get()
+        self.assertEqual(job.attempts, 1)
+        self.assertFalse(job.failed)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(sbcomment.jobs.run_pending(), 0)
@@ -1,8 +1,10 @@
 from django.conf.urls import url
 
+from songbook.db import read_only
 from sbcomment import feeds
 
 
 urlpatterns = [
-    url(r'^feeds/(?P<slug>[^/]+)$', feeds.GigCommentsFeed(), name='view-gig'),
+    url(r'^feeds/(?P<slug>[^/]+)$', read_only(feeds.gig_comments_feed),
+        name='view-gig'),
 ]
@@ -5,4 +5,5 @@ from . import views
 
 urlpatterns = [
     url(r'^$', views.dashboard, name='dashboard'),
+    url(r'^perf/$', views.perf_summary, name='perf-summary'),
 ]
@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.http import HttpResponseRedirect
 from django.core.urlresolvers import reverse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
 
+from songbook import perf
 import sbgig.models
 
 
@@ -10,3 +14,11 @@ def dashboard(request):
     latest_gig = sbgig.models.Gig.objects.order_by('-date')[0]
     return HttpResponseRedirect(reverse('sbgig:view-gig',
                                         args=[latest_gig.slug]))
+
+
+@staff_member_required
+def perf_summary(request):
+    return render(request, 'sbdashboard/perf_summary.html', {
+        'enabled': settings.SB_PERF_INSTRUMENTATION,
+        'summary': perf.get_summary(),
+    })
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class SbgigConfig(AppConfig):
+    name = 'sbgig'
+
+    def ready(self):
+        import sbgig.signals  # noqa
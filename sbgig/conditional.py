@@ -0,0 +1,75 @@
+"""
+ETag and Last-Modified validators of gig pages, see songbook.conditional.
+"""
+from django.db.models import Count, Max, Sum
+
+from songbook.conditional import page_etag, latest
+import sbcomment.models
+import sbgig.models
+import sbsong.models
+
+
+def _gig_state(request, slug, staffed_only=False):
+    cache = request.__dict__.setdefault('_gig_state', {})
+    key = (slug, staffed_only)
+    if key not in cache:
+        cache[key] = _load_gig_state(request, slug, staffed_only)
+    return cache[key]
+
+
+def _load_gig_state(request, slug, staffed_only):
+    gig = sbgig.models.Gig.objects.filter(slug=slug) \
+                                  .values('id', 'version').first()
+    if gig is None:
+        return None
+    gig_id = gig['id']
+    songs = sbsong.models.Song.objects.filter(gig_id=gig_id)
+    if staffed_only:
+        songs = songs.filter(staffed=True)
+    # versions only grow, so their sum changes with any change of
+    # a song, along with the count when one is moved or deleted
+    state = songs.aggregate(songs_version=Sum('version'),
+                            songs_changed_at=Max('changed_at'),
+                            num_songs=Count('id'), max_song_id=Max('id'))
+    state['gig_id'] = gig_id
+    state['gig_version'] = gig['version']
+    if staffed_only:
+        return state
+    state.update(sbcomment.models.Comment.objects.filter(gig_id=gig_id)
+                 .aggregate(comments_changed_at=Max('datetime'),
+                            num_comments=Count('id')))
+    state.update(sbsong.models.SongWatcher.objects
+                 .filter(song__gig_id=gig_id, user=request.user)
+                 .aggregate(last_seen=Max('last_seen'),
+                            num_watched=Count('id')))
+    return state
+
+
+def gig_etag(request, slug):
+    state = _gig_state(request, slug)
+    if state is None:
+        return None
+    return page_etag(request, 'gig', sorted(state.items()))
+
+
+def gig_last_modified(request, slug):
+    state = _gig_state(request, slug)
+    if state is None:
+        return None
+    return latest(state['songs_changed_at'], state['comments_changed_at'],
+                  state['last_seen'])
+
+
+def setlist_etag(request, slug):
+    state = _gig_state(request, slug, staffed_only=True)
+    if state is None:
+        return None
+    return page_etag(request, 'setlist', sorted(state.items()),
+                     relative_times=False)
+
+
+def setlist_last_modified(request, slug):
+    state = _gig_state(request, slug, staffed_only=True)
+    if state is None:
+        return None
+    return state['songs_changed_at']
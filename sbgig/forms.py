@@ -3,6 +3,7 @@ from django import forms
 from songbook.forms import BootstrapModelForm
 
 import sbgig.models
+import sbsong.forms
 
 
 class GigForm(BootstrapModelForm):
@@ -14,3 +15,19 @@ class GigForm(BootstrapModelForm):
             'date': forms.TextInput(attrs={'type': 'date', 'required': True}),
             'description': forms.Textarea(attrs={'rows': 6})
         }
+
+
+def make_copy_songs_form(gig, *args, **kwargs):
+    """
+    Return form for copying songs of the gig to another future gig,
+    or None if there are no such gigs. No selected songs mean all.
+    """
+    form = sbsong.forms.make_copy_to_gig_form(*args, exclude_gig=gig,
+                                              **kwargs)
+    if form is not None:
+        form.fields['songs'] = forms.TypedMultipleChoiceField(
+            required=False, coerce=int,
+            choices=[(song.id, str(song))
+                     for song in gig.songs.order_by('title')]
+        )
+    return form
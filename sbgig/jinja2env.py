@@ -1,12 +1,48 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 
+from songbook import perf
 import sbgig.models
 
 
-def all_gigs(*, only_future=False, only_past=False):
-    gigs = sbgig.models.Gig.objects.order_by('date')
-    if only_future:
-        gigs = gigs.filter(date__gte=timezone.now().date())
-    if only_past:
-        gigs = gigs.filter(date__lt=timezone.now().date())
-    return gigs
+GigMenu = namedtuple('GigMenu', ['future', 'past'])
+GigMenuItem = namedtuple('GigMenuItem', ['slug', 'title', 'date'])
+
+
+def _gig_menu_cache_key(today):
+    return 'sbgig:gig-menu:%s' % today.isoformat()
+
+
+def gig_menu():
+    """
+    Return future and past gigs for the navigation menu, latest first.
+
+    Past gigs are limited to SB_GIG_MENU_PAST_GIGS most recent ones.
+    The result is cached until a gig is saved or deleted.
+    """
+    today = timezone.now().date()
+    key = _gig_menu_cache_key(today)
+    menu = cache.get(key)
+    perf.record_cache('gig_menu', menu is not None)
+    if menu is None:
+        fields = GigMenuItem._fields
+        future_gigs = sbgig.models.Gig.objects.filter(date__gte=today)
+        past_gigs = sbgig.models.Gig.objects.filter(date__lt=today)
+        past_gigs = past_gigs.order_by('-date')
+        if settings.SB_GIG_MENU_PAST_GIGS is not None:
+            past_gigs = past_gigs[:settings.SB_GIG_MENU_PAST_GIGS]
+        future_gigs = future_gigs.order_by('-date').values_list(*fields)
+        past_gigs = past_gigs.values_list(*fields)
+        menu = GigMenu(
+            future=[GigMenuItem(*values) for values in future_gigs],
+            past=[GigMenuItem(*values) for values in past_gigs],
+        )
+        cache.set(key, menu, settings.SB_GIG_MENU_CACHE_TIMEOUT)
+    return menu
+
+
+def invalidate_gig_menu():
+    cache.delete(_gig_menu_cache_key(timezone.now().date()))
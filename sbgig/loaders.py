@@ -0,0 +1,104 @@
+"""
+Data loaders for gig pages.
+
+Every loader runs a fixed number of queries, however many songs, parts
+and performers the gig has. ``sbgig.tests`` holds them to that.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db.models import Min
+
+from songbook.jinja2env import format_timedelta
+
+import sbsong.models
+
+
+GigPage = namedtuple('GigPage', ['songs', 'user_plays'])
+
+# maximum number of queries made by load_gig_page()
+GIG_PAGE_QUERIES = 5
+
+
+def load_gig_page(gig, user):
+    """
+    Return songs of the gig grouped into 'staffed-mine', 'staffed-other',
+    'unstaffed-mine' and 'unstaffed-other' lists, and ids of instruments
+    the user plays.
+
+    Songs get ``is_watched``, ``updated_since_last_seen``, ``is_mine``
+    and ``mine_readiness`` attributes. Staffed songs get a list of
+    ``desirable_parts`` and unstaffed ones ``unstaffed_parts``, which are
+    their parts without performers. ``card_version`` identifies what
+    the song's card on the page shows for the user.
+    """
+    songs = list(gig.songs.select_related('staffing').order_by('id'))
+    _ensure_staffing(songs)
+    last_seen_by_song_id = dict(
+        sbsong.models.SongWatcher.objects.filter(user=user, song__gig=gig)
+                                         .values_list('song_id', 'last_seen')
+    )
+    mine_readiness = dict(
+        sbsong.models.SongPerformer.objects.filter(performer=user,
+                                                   part__song__gig=gig)
+                                           .values_list('part__song_id')
+                                           .annotate(Min('readiness'))
+    )
+    empty_part_ids = [part_id
+                      for song in songs
+                      for part_id in song.staffing.get_empty_part_ids()]
+    empty_parts = sbsong.models.SongPart.objects.filter(id__in=empty_part_ids)
+    empty_parts = empty_parts.select_related('instrument').order_by('song',
+                                                                     'id')
+    empty_parts_by_song_id = defaultdict(list)
+    for empty_part in empty_parts:
+        empty_parts_by_song_id[empty_part.song_id].append(empty_part)
+    user_plays = set(user.plays.values_list('instrument_id', flat=True))
+
+    grouped = {
+        'staffed-mine': [],
+        'staffed-other': [],
+        'unstaffed-mine': [],
+        'unstaffed-other': [],
+    }
+    for song in songs:
+        last_seen = last_seen_by_song_id.get(song.id)
+        song.is_watched = last_seen is not None
+        song.updated_since_last_seen = None
+        if song.is_watched:
+            song.updated_since_last_seen = (song.changed_at > last_seen)
+        song.is_mine = song.id in mine_readiness
+        if song.is_mine:
+            song.mine_readiness = mine_readiness[song.id]
+        parts = empty_parts_by_song_id.get(song.id, ())
+        if song.staffed:
+            song.desirable_parts = parts
+            key = 'staffed'
+        else:
+            song.unstaffed_parts = parts
+            key = 'unstaffed'
+        key += '-mine' if song.is_mine else '-other'
+        song.card_version = _card_version(song, user_plays)
+        grouped[key].append(song)
+    return GigPage(songs=grouped, user_plays=user_plays)
+
+
+def _card_version(song, user_plays):
+    version = [song.id, song.version, song.changed_at, song.readiness,
+               song.staffed, song.staffing.empty_part_ids, song.is_mine,
+               song.updated_since_last_seen]
+    if song.is_mine:
+        version.append(song.mine_readiness)
+    if song.updated_since_last_seen:
+        version.append(format_timedelta(song.changed_at))
+    # parts the user plays are marked
+    version.append(sorted(user_plays))
+    return version
+
+
+def _ensure_staffing(songs):
+    # summaries are created along with songs, only songs inserted in bulk
+    # and not followed by staffing.rebuild() lack them; pages are read
+    # only, so such songs are shown without parts to fill until then
+    for song in songs:
+        if not hasattr(song, 'staffing'):
+            song.staffing = sbsong.models.SongStaffing(song=song)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbgig', '0005_gig_description_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gig',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,108 @@
+"""
+Setlist matrix of a gig: staffed songs by instruments they are
+performed on.
+
+The matrix is built from plain values, so it's cached as is and shared
+by HTML, CSV and JSON renderings. ``sbgig.signals`` drops it whenever
+songs, parts or performers of the gig change.
+"""
+from collections import namedtuple, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from songbook import perf
+import sbsong.models
+
+
+SetlistMatrix = namedtuple('SetlistMatrix', ['instruments', 'songs'])
+SetlistInstrument = namedtuple('SetlistInstrument', ['id', 'name'])
+# performers are usernames by instrument id
+SetlistSong = namedtuple('SetlistSong', ['id', 'title', 'artist',
+                                         'readiness', 'performers'])
+
+
+def _cache_key(gig_id):
+    return 'sbgig:setlist:%d' % gig_id
+
+
+def get(gig_id):
+    """
+    Return the setlist matrix of the gig, building it if it isn't cached.
+    """
+    key = _cache_key(gig_id)
+    matrix = cache.get(key)
+    perf.record_cache('setlist', matrix is not None)
+    if matrix is None:
+        matrix = build(gig_id)
+        cache.set(key, matrix, settings.SB_SETLIST_CACHE_TIMEOUT)
+    return matrix
+
+
+def invalidate(gig_id):
+    if gig_id is None:
+        return
+    key = _cache_key(gig_id)
+    cache.delete(key)
+    # other requests may cache the old matrix until the change is committed
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def build(gig_id):
+    """
+    Return the setlist matrix of the gig in two queries.
+
+    Only instruments somebody performs on are included, ordered by name.
+    """
+    songs = sbsong.models.Song.objects.filter(gig_id=gig_id, staffed=True)
+    songs = songs.order_by('id')
+    songs = OrderedDict(
+        (song_id, SetlistSong(song_id, title, artist, readiness, {}))
+        for song_id, title, artist, readiness in songs.values_list(
+            'id', 'title', 'artist', 'readiness'
+        )
+    )
+    songperfs = sbsong.models.SongPerformer.objects.filter(
+        part__song_id__in=list(songs), performer__isnull=False
+    ).order_by('part_id', 'id').values_list(
+        'part__song_id', 'part__instrument_id', 'part__instrument__name',
+        'performer__username'
+    )
+    instruments = {}
+    for song_id, instrument_id, instrument_name, username in songperfs:
+        instruments[instrument_id] = SetlistInstrument(instrument_id,
+                                                       instrument_name)
+        performers = songs[song_id].performers
+        performers.setdefault(instrument_id, []).append(username)
+    instruments = sorted(instruments.values(),
+                         key=lambda instrument: instrument.name)
+    return SetlistMatrix(instruments=instruments, songs=list(songs.values()))
+
+
+def as_rows(matrix):
+    """
+    Yield the matrix as rows of strings, starting with the header.
+    """
+    yield (['Song', 'Artist']
+           + [instrument.name for instrument in matrix.instruments])
+    for song in matrix.songs:
+        yield ([song.title, song.artist]
+               + [', '.join(song.performers.get(instrument.id, ()))
+                  for instrument in matrix.instruments])
+
+
+def as_dict(matrix):
+    return {
+        'instruments': [instrument._asdict()
+                        for instrument in matrix.instruments],
+        'songs': [
+            {'id': song.id, 'title': song.title, 'artist': song.artist,
+             'readiness': song.readiness,
+             'parts': [{'instrument': instrument.id,
+                        'performers': song.performers[instrument.id]}
+                       for instrument in matrix.instruments
+                       if instrument.id in song.performers]}
+            for song in matrix.songs
+        ],
+    }
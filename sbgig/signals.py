@@ -0,0 +1,51 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+import sbgig.models
+import sbgig.jinja2env
+import sbgig.setlist
+import sbsong.models
+
+
+@receiver([post_save, post_delete], sender=sbgig.models.Gig)
+def gig_changed(sender, **kwargs):
+    sbgig.jinja2env.invalidate_gig_menu()
+
+
+@receiver([post_save, post_delete], sender=sbsong.models.Song)
+def song_changed(sender, instance, **kwargs):
+    sbgig.setlist.invalidate(instance.gig_id)
+    # a song removed from or moved to another gig leaves its old setlist
+    old_gig_id = instance._pristine.get('gig_id')
+    if old_gig_id != instance.gig_id:
+        sbgig.setlist.invalidate(old_gig_id)
+
+
+@receiver([post_save, post_delete], sender=sbsong.models.SongPart)
+def part_changed(sender, instance, **kwargs):
+    try:
+        gig_id = instance.song.gig_id
+    except sbsong.models.Song.DoesNotExist:
+        # deleted along with its song, which invalidates the setlist
+        return
+    sbgig.setlist.invalidate(gig_id)
+
+
+@receiver([post_save, post_delete], sender=sbsong.models.SongPerformer)
+def performer_changed(sender, instance, **kwargs):
+    try:
+        gig_id = instance.part.song.gig_id
+    except (sbsong.models.SongPart.DoesNotExist,
+            sbsong.models.Song.DoesNotExist):
+        # deleted along with its song, which invalidates the setlist
+        return
+    sbgig.setlist.invalidate(gig_id)
+
+
+@receiver(post_save, sender=sbsong.models.Instrument)
+def instrument_changed(sender, instance, created, **kwargs):
+    if not created:
+        for gig_id in sbgig.models.Gig.objects.filter(
+                songs__parts__instrument=instance
+        ).values_list('id', flat=True).distinct():
+            sbgig.setlist.invalidate(gig_id)
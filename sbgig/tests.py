@@ -0,0 +1,170 @@
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from sbgig.loaders import load_gig_page, GIG_PAGE_QUERIES
+import sbcomment.actions
+import sbcomment.models
+import sbgig.models
+import sbgig.setlist
+import sbsong.models
+import sbuser.models
+
+
+class GigPageQueriesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        other_user = User.objects.create(username='other')
+        cls.gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                                  date=date.today())
+        instrument = sbsong.models.Instrument.objects.create(name='Guitar')
+        # a staffed and an unstaffed song of each, with a part left to fill
+        for idx, (staffed, mine) in enumerate([(True, True), (True, False),
+                                               (False, True), (False, False)]):
+            song = sbsong.models.Song.objects.create(
+                gig=cls.gig, title='Song %d' % idx, suggested_by=other_user,
+                changed_by=other_user
+            )
+            required = sbsong.models.SongPart.objects.create(
+                song=song, instrument=instrument, required=True
+            )
+            optional = sbsong.models.SongPart.objects.create(
+                song=song, instrument=instrument, required=False
+            )
+            sbsong.models.SongPerformer.objects.create(
+                part=required if staffed else optional,
+                performer=cls.user if mine else other_user
+            )
+            sbsong.models.SongWatcher.objects.create(song=song, user=cls.user)
+
+    def test_query_budget(self):
+        with self.assertNumQueries(GIG_PAGE_QUERIES):
+            page = load_gig_page(self.gig, self.user)
+        self.assertEqual(
+            {key: [song.title for song in songs]
+             for key, songs in page.songs.items()},
+            {'staffed-mine': ['Song 0'], 'staffed-other': ['Song 1'],
+             'unstaffed-mine': ['Song 2'], 'unstaffed-other': ['Song 3']}
+        )
+        self.assertEqual(len(page.songs['staffed-mine'][0].desirable_parts),
+                         1)
+
+
+class GigPageConditionalGetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        sbuser.models.Profile.objects.create(user=cls.user,
+                                             password_change_required=False)
+        cls.gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                                  date=date.today())
+        cls.song = sbsong.models.Song.objects.create(
+            gig=cls.gig, title='Song', suggested_by=cls.user,
+            changed_by=cls.user
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertNotModifiedUntilChanged(self, url, change):
+        # the clock is stopped, so changes must show in more than timestamps
+        now = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_gig_page(self):
+        self.assertNotModifiedUntilChanged(
+            reverse('sbgig:view-gig', args=[self.gig.slug]),
+            lambda: sbcomment.models.Comment.objects.create(
+                gig=self.gig, author=self.user, text="Hi",
+                comment_type=sbcomment.models.Comment.CT_GIG_COMMENT
+            )
+        )
+
+    def test_setlist(self):
+        def toggle_staffed():
+            sbsong.models.Song.objects.filter(pk=self.song.pk).update(
+                staffed=not self.song.staffed
+            )
+        self.assertNotModifiedUntilChanged(
+            reverse('sbgig:setlist', args=[self.gig.slug]), toggle_staffed
+        )
+
+
+class WaitForCommentsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        sbuser.models.Profile.objects.create(user=cls.user,
+                                             password_change_required=False)
+        gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                              date=date.today())
+        cls.song = sbsong.models.Song.objects.create(
+            gig=gig, title='Song', suggested_by=cls.user, changed_by=cls.user
+        )
+        sbcomment.actions.song_comment_written(cls.song, cls.user, "Hello")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    @override_settings(SB_COMMENTS_WAIT_TIMEOUT=0)
+    def test_wait_song_comments(self):
+        url = reverse('sbgig:wait-song-comments', args=[self.song.id])
+        after = self.song.comments.first().seq
+        response = self.client.get(url, {'after': after})
+        self.assertEqual(response.status_code, 204)
+        sbcomment.actions.song_comment_written(self.song, self.user, "Hi")
+        comment = self.song.comments.order_by('-id').first()
+        response = self.client.get(url, {'after': after})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'data-comment-id="%d"' % comment.id)
+
+
+class SetlistMatrixTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create(username=username)
+                 for username in ('user', 'other')]
+        cls.gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                                  date=date.today())
+        instruments = [sbsong.models.Instrument.objects.create(name=name)
+                       for name in ('Guitar', 'Drums')]
+        for idx in range(2):
+            song = sbsong.models.Song.objects.create(
+                gig=cls.gig, title='Song %d' % idx, suggested_by=users[0],
+                changed_by=users[0]
+            )
+            for user, instrument in zip(users, instruments):
+                part = sbsong.models.SongPart.objects.create(
+                    song=song, instrument=instrument, required=True
+                )
+                sbsong.models.SongPerformer.objects.create(part=part,
+                                                           performer=user)
+
+    def setUp(self):
+        # ids of rolled back gigs are reused, so matrices cached by other
+        # tests would be found
+        cache.clear()
+
+    def test_cached_matrix_follows_performers(self):
+        self.assertEqual(sbgig.setlist.get(self.gig.id),
+                         sbgig.setlist.build(self.gig.id))
+        sbsong.models.SongPerformer.objects.filter(
+            part__song__gig=self.gig
+        ).first().delete()
+        with self.assertNumQueries(2):
+            matrix = sbgig.setlist.get(self.gig.id)
+        self.assertEqual(matrix, sbgig.setlist.build(self.gig.id))
+        with self.assertNumQueries(0):
+            sbgig.setlist.get(self.gig.id)
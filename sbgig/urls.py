@@ -6,6 +6,8 @@ from . import views
 urlpatterns = [
     url(r'^(?P<slug>[^/]+)$', views.view_gig, name='view-gig'),
     url(r'^(?P<slug>[^/]+)/edit$', views.edit_gig, name='edit-gig'),
+    url(r'^(?P<slug>[^/]+)/copy-songs$',
+        views.copy_songs, name='copy-songs'),
     url(r'^(?P<slug>[^/]+)/add-comment$',
         views.add_gig_comment, name='add-gig-comment'),
     url(r'^add-song-comment/(?P<song_id>\d+)$',
@@ -15,7 +17,19 @@ urlpatterns = [
         views.get_gig_comments, name='get-gig-comments'),
     url(r'^song-comments/(?P<song_id>\d+)$',
         views.get_song_comments, name='get-song-comments'),
+    url(r'^(?P<slug>[^/]+)/comments\.json$',
+        views.get_gig_comments_json, name='get-gig-comments-json'),
+    url(r'^song-comments/(?P<song_id>\d+)\.json$',
+        views.get_song_comments_json, name='get-song-comments-json'),
+    url(r'^(?P<slug>[^/]+)/comments/wait$',
+        views.wait_gig_comments, name='wait-gig-comments'),
+    url(r'^song-comments/(?P<song_id>\d+)/wait$',
+        views.wait_song_comments, name='wait-song-comments'),
 
     url(r'^(?P<slug>[^/]+)/setlist$',
         views.setlist, name='setlist'),
+    url(r'^(?P<slug>[^/]+)/setlist\.csv$',
+        views.setlist_csv, name='setlist-csv'),
+    url(r'^(?P<slug>[^/]+)/setlist\.json$',
+        views.setlist_json, name='setlist-json'),
 ]
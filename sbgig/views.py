@@ -1,82 +1,48 @@
-from collections import defaultdict
-import itertools
+import csv
+import threading
+import time
 
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ugettext_lazy as _, ungettext
 from django.core.urlresolvers import reverse
-from django.http import HttpResponseRedirect, HttpResponse, JsonResponse
+from django.http import (
+    HttpResponseRedirect, HttpResponse, JsonResponse, StreamingHttpResponse,
+)
 from django.contrib import messages
-from django.db.models import Count, Min
 from django.conf import settings
+from django.views.decorators.http import condition
 
+from songbook.db import read_only
+import sbsong.copying
+import sbsong.forms
 import sbsong.models
 import sbgig.models
 import sbcomment.models
 import sbcomment.actions
+import sbcomment.notifier
+import sbcomment.paging
+import sbgig.conditional
 import sbgig.forms
+import sbgig.loaders
+import sbgig.setlist
 
 
+@read_only
 @login_required
+@condition(etag_func=sbgig.conditional.gig_etag,
+           last_modified_func=sbgig.conditional.gig_last_modified)
 def view_gig(request, slug):
     gig = get_object_or_404(sbgig.models.Gig, slug=slug)
-    staffed_songs = list(gig.songs.filter(staffed=True))
-    unstaffed_songs = list(gig.songs.filter(staffed=False))
-    empty_parts = (sbsong.models.SongPart.objects.filter(song__gig=gig)
-                         .annotate(num_perf=Count('songperformer'))
-                         .filter(num_perf=0)
-                         .select_related('instrument')
-                         .order_by('song', 'id'))
-    empty_parts_by_song_id = defaultdict(list)
-    songwatchers = sbsong.models.SongWatcher.objects.filter(user=request.user,
-                                                            song__gig=gig)
-    mine_readiness = dict(
-        gig.songs.filter(parts__songperformer__performer=request.user)
-                 .annotate(mr=Min('parts__songperformer__readiness'))
-                 .values_list('pk', 'mr')
+    page = sbgig.loaders.load_gig_page(gig, request.user)
+    comments = sbcomment.paging.get_page(
+        gig, limit=settings.SB_COMMENTS_ON_PAGE + 1
     )
-    mine_song_ids = set(
-        gig.songs.filter(parts__songperformer__performer=request.user)
-                 .values_list('pk', flat=True)
-    )
-    songwatchers = dict(songwatchers.values_list('song_id', 'last_seen'))
-    songs = {
-        'staffed-mine': [],
-        'staffed-other': [],
-        'unstaffed-mine': [],
-        'unstaffed-other': [],
-    }
-    for song in itertools.chain(staffed_songs, unstaffed_songs):
-        last_seen = songwatchers.get(song.id)
-        song.is_watched = last_seen is not None
-        song.updated_since_last_seen = None
-        if song.is_watched:
-            song.updated_since_last_seen = (song.changed_at > last_seen)
-        song.is_mine = song.id in mine_song_ids
-        if song.is_mine:
-            song.mine_readiness = mine_readiness[song.pk]
-    for empty_part in empty_parts:
-        empty_parts_by_song_id[empty_part.song_id].append(empty_part)
-    for song in unstaffed_songs:
-        song.unstaffed_parts = empty_parts_by_song_id.get(song.id, ())
-        if song.is_mine:
-            songs['unstaffed-mine'].append(song)
-        else:
-            songs['unstaffed-other'].append(song)
-    for song in staffed_songs:
-        song.desirable_parts = empty_parts_by_song_id.get(song.id, ())
-        if song.is_mine:
-            songs['staffed-mine'].append(song)
-        else:
-            songs['staffed-other'].append(song)
-    comments = gig.comments.filter(
-        comment_type__in=sbcomment.models.Comment.GIG_ONLY_COMMENTS
-    )[:settings.SB_COMMENTS_ON_PAGE + 1]
-    user_plays = set(request.user.plays.all().values_list('instrument_id',
-                                                          flat=True))
+    copy_to_gig_form = sbsong.forms.make_copy_to_gig_form(exclude_gig=gig)
     return render(request, 'sbgig/view_gig.html',
-                  {'gig': gig, 'songs': songs,
-                   'comments': comments, 'user_plays': user_plays})
+                  {'gig': gig, 'songs': page.songs,
+                   'comments': comments, 'user_plays': page.user_plays,
+                   'copy_to_gig_form': copy_to_gig_form})
 
 
 @login_required
@@ -93,6 +59,32 @@ def edit_gig(request, slug):
                   {'gig': gig, 'form': form})
 
 
+@login_required
+def copy_songs(request, slug):
+    gig = get_object_or_404(sbgig.models.Gig, slug=slug)
+    form = sbgig.forms.make_copy_songs_form(gig, request.POST or None)
+    if not form or not form.is_valid():
+        return HttpResponse(status=400)
+    target_gig = get_object_or_404(sbgig.models.Gig,
+                                   id=form.cleaned_data['target_gig'])
+    songs = gig.songs.order_by('id')
+    if form.cleaned_data['songs']:
+        songs = songs.filter(id__in=form.cleaned_data['songs'])
+    songs = list(songs)
+    copies = sbsong.copying.copy_songs(
+        songs, target_gig, request.user,
+        copy_participants=form.cleaned_data['copy_participants'],
+        copy_links=form.cleaned_data['copy_links']
+    )
+    for copy, song in zip(copies, songs):
+        sbcomment.actions.song_copied(request.user, copy, song)
+    messages.add_message(request, messages.INFO, ungettext(
+        "%(num)d song copied", "%(num)d songs copied", len(copies)
+    ) % {'num': len(copies)})
+    return HttpResponseRedirect(reverse('sbgig:view-gig',
+                                        args=[target_gig.slug]))
+
+
 @login_required
 def add_gig_comment(request, slug):
     gig = get_object_or_404(sbgig.models.Gig, slug=slug)
@@ -116,21 +108,7 @@ def add_song_comment(request, song_id):
     return JsonResponse({'result': 'ok'})
 
 
-def _get_comments(request, gig, song):
-    not_after = request.GET.get('not_after')
-    not_before = request.GET.get('not_before')
-    if song:
-        qs = song.comments.all()
-    else:
-        qs = gig.comments.all()
-    if not_before:
-        qs = qs.filter(id__gt=not_before)
-    if not_after:
-        qs = qs.filter(id__lt=not_after)
-    if song is None:
-        qs = qs.filter(comment_type__in=sbcomment.models.Comment.GIG_ONLY_COMMENTS)
-    qs = qs.select_related('song', 'gig', 'author')
-    comments = list(qs[:settings.SB_COMMENTS_ON_PAGE + 1])
+def _render_comments(request, comments, song):
     songwatcher = None
     if song:
         songwatcher = song.watchers.filter(user=request.user).first()
@@ -138,38 +116,195 @@ def _get_comments(request, gig, song):
                                                    'songwatcher': songwatcher})
 
 
+def _get_cursor(request, name):
+    value = request.GET.get(name)
+    return int(value) if value else None
+
+
+def _get_comments_page(request, gig, song):
+    # one comment more than fits the page tells there are more of them
+    return sbcomment.paging.get_page(
+        gig, song, before=_get_cursor(request, 'before'),
+        after=_get_cursor(request, 'after'),
+        limit=settings.SB_COMMENTS_ON_PAGE + 1
+    )
+
+
+def _get_comments(request, gig, song):
+    try:
+        comments = _get_comments_page(request, gig, song)
+    except ValueError:
+        return HttpResponse(status=400)
+    return _render_comments(request, comments, song)
+
+
+def _get_comments_json(request, gig, song):
+    try:
+        comments = _get_comments_page(request, gig, song)
+    except ValueError:
+        return HttpResponse(status=400)
+    after = _get_cursor(request, 'after')
+    has_more = len(comments) > settings.SB_COMMENTS_ON_PAGE
+    next_page = None
+    if after is not None:
+        # the newest comments didn't fit and make the next page
+        comments = comments[-settings.SB_COMMENTS_ON_PAGE:]
+        if has_more:
+            next_page = {'after': comments[0].seq}
+    else:
+        comments = comments[:settings.SB_COMMENTS_ON_PAGE]
+        if has_more:
+            next_page = {'before': comments[-1].seq}
+    return JsonResponse({
+        'comments': [comment.as_dict() for comment in comments],
+        'next': next_page,
+        # cursor to wait for comments newer than these
+        'newest': comments[0].seq if comments else after,
+    })
+
+
+_waiters = None
+_waiters_lock = threading.Lock()
+
+
+def _get_waiters():
+    global _waiters
+    with _waiters_lock:
+        if _waiters is None:
+            _waiters = threading.BoundedSemaphore(
+                settings.SB_COMMENTS_MAX_WAITERS
+            )
+    return _waiters
+
+
+def _wait_for_comments(request, gig, song):
+    # long-poll: respond as soon as there are comments newer than 'after',
+    # or with 204 once SB_COMMENTS_WAIT_TIMEOUT seconds pass
+    try:
+        after = _get_cursor(request, 'after') or 0
+    except ValueError:
+        return HttpResponse(status=400)
+    waiters = _get_waiters()
+    if not waiters.acquire(blocking=False):
+        # every waiter holds a server thread; pages retry after a while
+        response = HttpResponse(status=503)
+        response['Retry-After'] = settings.SB_COMMENTS_WAIT_TIMEOUT
+        return response
+    try:
+        return _wait_for_new_comments(request, gig, song, after)
+    finally:
+        waiters.release()
+
+
+def _wait_for_new_comments(request, gig, song, after):
+    notifier = sbcomment.notifier.notifier
+    if song:
+        key = sbcomment.notifier.song_key(song.id)
+    else:
+        key = sbcomment.notifier.gig_key(gig.id)
+    deadline = time.monotonic() + settings.SB_COMMENTS_WAIT_TIMEOUT
+    while True:
+        version = notifier.version(key)
+        shared_version = sbcomment.notifier.shared_version(key)
+        comments = sbcomment.paging.get_page(
+            gig, song, after=after, limit=settings.SB_COMMENTS_ON_PAGE + 1
+        )
+        if comments:
+            return _render_comments(request, comments, song)
+        # the database is queried again only once a comment was saved
+        # in this process or, as the shared version tells, in another
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return HttpResponse(status=204)
+            if notifier.wait(key, version,
+                             min(remaining,
+                                 settings.SB_COMMENTS_WAIT_RECHECK)):
+                break
+            if sbcomment.notifier.shared_version(key) != shared_version:
+                break
+
+
+@read_only
 @login_required
 def get_gig_comments(request, slug):
     gig = get_object_or_404(sbgig.models.Gig, slug=slug)
     return _get_comments(request, gig, song=None)
 
 
+@read_only
 @login_required
 def get_song_comments(request, song_id):
     song = get_object_or_404(sbsong.models.Song, pk=song_id)
     return _get_comments(request, song.gig, song)
 
 
+@read_only
+@login_required
+def get_gig_comments_json(request, slug):
+    gig = get_object_or_404(sbgig.models.Gig, slug=slug)
+    return _get_comments_json(request, gig, song=None)
+
+
+@read_only
+@login_required
+def get_song_comments_json(request, song_id):
+    song = get_object_or_404(sbsong.models.Song, pk=song_id)
+    return _get_comments_json(request, song.gig, song)
+
+
+# waiting views are read_only, a transaction held open would keep them
+# from seeing new comments and block writers on SQLite
+@read_only
+@login_required
+def wait_gig_comments(request, slug):
+    gig = get_object_or_404(sbgig.models.Gig, slug=slug)
+    return _wait_for_comments(request, gig, song=None)
+
+
+@read_only
+@login_required
+def wait_song_comments(request, song_id):
+    song = get_object_or_404(sbsong.models.Song, pk=song_id)
+    return _wait_for_comments(request, song.gig, song)
+
+
+@read_only
 @login_required
+@condition(etag_func=sbgig.conditional.setlist_etag,
+           last_modified_func=sbgig.conditional.setlist_last_modified)
 def setlist(request, slug):
     gig = get_object_or_404(sbgig.models.Gig, slug=slug)
-    songs = list(gig.songs.filter(staffed=True))
-    song_ids = [song.id for song in songs]
-    songperfs = sbsong.models.SongPerformer.objects.filter(
-        part__song__pk__in=song_ids
-    ).select_related(
-        'part__song', 'performer', 'part__instrument'
+    matrix = sbgig.setlist.get(gig.id)
+    return render(request, 'sbgig/setlist.html',
+                  {'gig': gig, 'matrix': matrix})
+
+
+class _Echo:
+    # file-like object for csv.writer which returns what's written
+    def write(self, value):
+        return value
+
+
+@read_only
+@login_required
+def setlist_csv(request, slug):
+    gig = get_object_or_404(sbgig.models.Gig, slug=slug)
+    matrix = sbgig.setlist.get(gig.id)
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in sbgig.setlist.as_rows(matrix)),
+        content_type='text/csv; charset=utf-8'
     )
-    performer_by_song_by_instrument = defaultdict(lambda: defaultdict(list))
-    used_instruments = set()
-    for songperf in songperfs:
-        used_instruments.add(songperf.part.instrument)
-        songparts = performer_by_song_by_instrument[songperf.part.song]
-        songparts[songperf.part.instrument].append(songperf.performer)
-    used_instruments = sorted(used_instruments,
-                              key=lambda instrument: instrument.name)
-    return render(
-        request, 'sbgig/setlist.html',
-        {'gig': gig, 'used_instruments': used_instruments, 'songs': songs,
-         'performer_by_song_by_instrument': performer_by_song_by_instrument}
+    response['Content-Disposition'] = (
+        'attachment; filename="%s-setlist.csv"' % gig.slug
     )
+    return response
+
+
+@read_only
+@login_required
+def setlist_json(request, slug):
+    gig = get_object_or_404(sbgig.models.Gig, slug=slug)
+    matrix = sbgig.setlist.get(gig.id)
+    return JsonResponse(dict(sbgig.setlist.as_dict(matrix), gig=gig.slug))
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class SbsongConfig(AppConfig):
+    name = 'sbsong'
+
+    def ready(self):
+        import sbsong.signals  # noqa
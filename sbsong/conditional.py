@@ -0,0 +1,82 @@
+"""
+ETag and Last-Modified validators of song pages, see songbook.conditional.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from songbook.conditional import page_etag, latest
+import sbcomment.models
+import sbsong.models
+
+
+def _song_state(request, song_id):
+    if not hasattr(request, '_song_state'):
+        request._song_state = _load_song_state(request, song_id)
+    return request._song_state
+
+
+def _load_song_state(request, song_id):
+    # version covers the song, its parts and links; changed_at only
+    # serves Last-Modified
+    song = sbsong.models.Song.objects.filter(pk=song_id) \
+        .values('version', 'changed_at', 'gig_id').first()
+    if song is None:
+        return None
+    state = dict(song)
+    state.update(sbcomment.models.Comment.objects.filter(song_id=song_id)
+                 .aggregate(comments_changed_at=Max('datetime'),
+                            num_comments=Count('id')))
+    watcher = sbsong.models.SongWatcher.objects \
+        .filter(song_id=song_id, user=request.user) \
+        .values_list('last_seen', flat=True).first()
+    # viewing the page moves last_seen, so the page depends on whether
+    # there are unread comments rather than on last_seen itself
+    state['is_watched'] = watcher is not None
+    if watcher is not None:
+        state['num_unread'] = sbcomment.models.Comment.objects.filter(
+            song_id=song_id, datetime__gt=watcher
+        ).count()
+    # users are listed in the join form
+    state['performers_version'] = _get_performers_version()
+    return state
+
+
+_PERFORMERS_VERSION_KEY = 'sbsong:performers-version'
+
+
+def _get_performers_version():
+    version = cache.get(_PERFORMERS_VERSION_KEY)
+    if version is None:
+        cache.add(_PERFORMERS_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(_PERFORMERS_VERSION_KEY)
+    return version
+
+
+def invalidate_performers():
+    """
+    Change validators of song pages after users listed in their join
+    form were added, renamed or deleted.
+    """
+    cache.set(_PERFORMERS_VERSION_KEY, uuid.uuid4().hex, None)
+    # other requests may validate the old list until the change is
+    # committed
+    transaction.on_commit(
+        lambda: cache.set(_PERFORMERS_VERSION_KEY, uuid.uuid4().hex, None)
+    )
+
+
+def song_etag(request, song_id):
+    state = _song_state(request, song_id)
+    if state is None:
+        return None
+    return page_etag(request, 'song', sorted(state.items()))
+
+
+def song_last_modified(request, song_id):
+    state = _song_state(request, song_id)
+    if state is None:
+        return None
+    return latest(state['changed_at'], state['comments_changed_at'])
@@ -0,0 +1,119 @@
+"""
+Copying songs to another gig in bulk.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from songbook.bulk import create_and_fetch
+from sbsong import models
+import sbgig.models
+import sbgig.setlist
+import sbsong.staffing
+
+
+def copy_songs(songs, gig, user, *, copy_participants=False,
+               copy_links=False):
+    """
+    Copy songs to the gig with their parts and watchers, and optionally
+    performers and links. Return copies in the order of ``songs``.
+
+    Copies are suggested and changed by ``user``. The number of queries
+    doesn't depend on the number of songs, parts or performers. Nothing
+    is written to comments, see ``sbcomment.actions.song_copied()``.
+    """
+    song_ids = [song.id for song in songs]
+    if not song_ids:
+        return []
+    with transaction.atomic():
+        # copies are made of fresh instances, the given ones stay intact
+        songs = models.Song.objects.in_bulk(song_ids)
+        songs = [songs[song_id] for song_id in song_ids]
+        parts = list(models.SongPart.objects.filter(song_id__in=song_ids)
+                                            .order_by('id'))
+        watchers = list(models.SongWatcher.objects.filter(
+            song_id__in=song_ids
+        ))
+        songperfs = []
+        if copy_participants:
+            songperfs = list(models.SongPerformer.objects.filter(
+                part__song_id__in=song_ids
+            ))
+        links = []
+        if copy_links:
+            links = list(models.SongLink.objects.filter(song_id__in=song_ids))
+
+        # staffing of copies follows from what is copied, so it's
+        # summarized here and staffed and readiness are inserted right
+        staffings = _summarize(song_ids, parts, songperfs)
+        for song, staffing in zip(songs, staffings):
+            song.pk = None
+            song.gig = gig
+            song.suggested_by = user
+            song.changed_by = user
+            song.staffed = staffing.staffed
+            song.readiness = staffing.readiness
+        copies = create_and_fetch(
+            models.Song, songs, gig=gig,
+            lock=sbgig.models.Gig.objects.filter(pk=gig.pk)
+        )
+        copy_ids = [song.id for song in copies]
+        copy_id_by_id = dict(zip(song_ids, copy_ids))
+
+        part_ids = [part.id for part in parts]
+        for part in parts:
+            part.pk = None
+            part.song_id = copy_id_by_id[part.song_id]
+        # copies aren't visible to others yet, so parts need no lock
+        parts = create_and_fetch(models.SongPart, parts,
+                                 song_id__in=copy_ids)
+        part_by_id = dict(zip(part_ids, parts))
+
+        for staffing in staffings:
+            staffing.song_id = copy_id_by_id[staffing.song_id]
+            staffing.set_empty_part_ids([
+                part_by_id[part_id].id
+                for part_id in staffing.get_empty_part_ids()
+            ])
+        models.SongStaffing.objects.bulk_create(staffings)
+
+        for watcher in watchers:
+            watcher.pk = None
+            watcher.song_id = copy_id_by_id[watcher.song_id]
+        models.SongWatcher.objects.bulk_create(watchers)
+        # watchers have seen the copies as made, so they aren't shown
+        # as updated since last seen
+        models.SongWatcher.objects.filter(song_id__in=copy_ids).update(
+            last_seen=max(copy.changed_at for copy in copies)
+        )
+
+        for songperf in songperfs:
+            songperf.pk = None
+            songperf.part = part_by_id[songperf.part_id]
+        models.SongPerformer.objects.bulk_create(songperfs)
+
+        # provider and embed link are copied along, so they needn't
+        # be classified again by SongLink.save()
+        for link in links:
+            link.pk = None
+            link.song_id = copy_id_by_id[link.song_id]
+        models.SongLink.objects.bulk_create(links)
+
+        # bulk inserts don't send the signal which maintains it
+        sbgig.setlist.invalidate(gig.id)
+    return copies
+
+
+def _summarize(song_ids, parts, songperfs):
+    readiness_by_part_id = defaultdict(list)
+    for songperf in songperfs:
+        readiness_by_part_id[songperf.part_id].append(songperf.readiness)
+    parts_by_song_id = defaultdict(list)
+    for part in parts:
+        readiness = readiness_by_part_id[part.id]
+        parts_by_song_id[part.song_id].append(
+            (part.id, part.song_id, part.required, len(readiness),
+             max(readiness, default=None))
+        )
+    return [sbsong.staffing.summarize(song_id, parts_by_song_id[song_id])
+            for song_id in song_ids]
@@ -0,0 +1,75 @@
+"""
+Providers of song links which can be embedded into a song page.
+
+Link provider and embed link are computed when a link is saved and
+stored in ``SongLink``, ``view_song.html`` renders any registered
+provider using its attributes.
+"""
+from collections import OrderedDict
+
+from django.utils.translation import ugettext_lazy as _
+
+from songbook.jinja2env import (
+    is_youtube_link, get_youtube_embed_link,
+    is_yamusic_link, get_yamusic_embed_link,
+)
+
+
+class LinkProvider:
+    """
+    :param label: shown before the link if it has no notice, if None
+                  the link itself is not shown, only embedded player
+    :param collapsible: player is hidden until "show" button is pressed
+    :param iframe_attrs: html attributes of player's iframe
+    """
+    def __init__(self, name, match, get_embed_link, *, label=None,
+                 collapsible=False, iframe_attrs=None):
+        self.name = name
+        self.match = match
+        self.get_embed_link = get_embed_link
+        self.label = label
+        self.collapsible = collapsible
+        self.iframe_attrs = iframe_attrs or {}
+
+
+_providers = OrderedDict()
+
+
+def register(provider):
+    _providers[provider.name] = provider
+    return provider
+
+
+def get_provider(name):
+    return _providers.get(name)
+
+
+def classify(link):
+    """
+    Return name of a provider and embed link for the link, or a pair
+    of empty strings if no provider recognizes it.
+
+    >>> classify('https://youtu.be/dQw4w9WgXcQ')
+    ('youtube', 'https://www.youtube.com/embed/dQw4w9WgXcQ')
+    >>> classify('http://example.com/')
+    ('', '')
+    """
+    for provider in _providers.values():
+        if provider.match(link):
+            embed_link = provider.get_embed_link(link)
+            if embed_link:
+                return provider.name, embed_link
+    return '', ''
+
+
+register(LinkProvider(
+    'yamusic', is_yamusic_link, get_yamusic_embed_link,
+    iframe_attrs={'style': 'border:none; width: 600px; height: 100px;'},
+))
+
+register(LinkProvider(
+    'youtube', is_youtube_link, get_youtube_embed_link,
+    label=_("YouTube video:"), collapsible=True,
+    iframe_attrs={'width': 600, 'height': 450, 'frameborder': 0,
+                  'allowfullscreen': 'allowfullscreen'},
+))
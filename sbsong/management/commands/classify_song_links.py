@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from sbsong import links
+from sbsong import models
+
+
+class Command(BaseCommand):
+    help = ("Fill in provider and embed link of existing song links, "
+            "e.g. after a new link provider was registered")
+
+    def handle(self, *args, **options):
+        num_updated = 0
+        songlinks = models.SongLink.objects.only('link', 'provider',
+                                                 'embed_link')
+        for songlink in songlinks.iterator():
+            provider, embed_link = links.classify(songlink.link)
+            if (provider, embed_link) == (songlink.provider,
+                                          songlink.embed_link):
+                continue
+            models.SongLink.objects.filter(pk=songlink.pk).update(
+                provider=provider, embed_link=embed_link
+            )
+            num_updated += 1
+        self.stdout.write("%d song links updated" % num_updated)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from sbsong import staffing
+
+
+class Command(BaseCommand):
+    help = ("Check song staffing summaries against song parts and "
+            "performers and rebuild missing or stale ones")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report inconsistent summaries, "
+                                 "fail if there are any")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            song_ids = staffing.rebuild(dry_run=options['check'])
+        if not options['check']:
+            self.stdout.write("%d song staffing summaries rebuilt" %
+                              len(song_ids))
+        elif song_ids:
+            raise CommandError(
+                "Staffing summaries of %d songs are inconsistent: %s" %
+                (len(song_ids), ', '.join(map(str, song_ids)))
+            )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from sbsong import staffing
+import sbgig.models
+import sbgig.setlist
+
+
+class Command(BaseCommand):
+    help = ("Recompute staffing summaries, staffed and readiness of all "
+            "songs, e.g. after songs, parts or performers were imported")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report inconsistent songs, "
+                                 "fail if there are any")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            song_ids = staffing.recompute_song_stats(
+                dry_run=options['check']
+            )
+            if song_ids and not options['check']:
+                # songs were updated in bulk, without signals
+                for gig_id in sbgig.models.Gig.objects.values_list(
+                        'id', flat=True):
+                    sbgig.setlist.invalidate(gig_id)
+        if not options['check']:
+            self.stdout.write("%d songs recomputed" % len(song_ids))
+        elif song_ids:
+            raise CommandError(
+                "%d songs are inconsistent: %s" %
+                (len(song_ids), ', '.join(map(str, song_ids)))
+            )
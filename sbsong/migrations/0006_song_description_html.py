@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbsong', '0005_song_watcher'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
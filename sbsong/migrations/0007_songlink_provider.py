@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbsong', '0006_song_description_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='songlink',
+            name='embed_link',
+            field=models.URLField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='songlink',
+            name='provider',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_staffing(apps, schema_editor):
+    Song = apps.get_model('sbsong', 'Song')
+    SongStaffing = apps.get_model('sbsong', 'SongStaffing')
+    for song in Song.objects.all():
+        staffing = SongStaffing(song=song)
+        empty_part_ids = []
+        readiness_sum = 0
+        parts = song.parts.annotate(
+            num_perf=models.Count('songperformer'),
+            best_readiness=models.Max('songperformer__readiness')
+        ).order_by('id')
+        for part in parts:
+            if part.required:
+                staffing.num_required_parts += 1
+                readiness_sum += part.best_readiness or 0
+                if not part.num_perf:
+                    staffing.num_empty_required_parts += 1
+            else:
+                staffing.num_optional_parts += 1
+            if not part.num_perf:
+                empty_part_ids.append(str(part.id))
+        staffing.empty_part_ids = ','.join(empty_part_ids)
+        if staffing.num_required_parts:
+            staffing.readiness = int(readiness_sum /
+                                     staffing.num_required_parts)
+        staffing.save()
+
+
+def delete_staffing(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbsong', '0007_songlink_provider'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SongStaffing',
+            fields=[
+                ('song', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='staffing', serialize=False, to='sbsong.Song')),
+                ('num_required_parts', models.PositiveSmallIntegerField(default=0)),
+                ('num_optional_parts', models.PositiveSmallIntegerField(default=0)),
+                ('num_empty_required_parts', models.PositiveSmallIntegerField(default=0)),
+                ('empty_part_ids', models.TextField(blank=True, default='')),
+                ('readiness', models.PositiveSmallIntegerField(default=0)),
+            ],
+        ),
+
+        migrations.RunPython(create_staffing, delete_staffing),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from sbsong import links
+
+
+def classify_song_links(apps, schema_editor):
+    # links saved before 0007 have no provider, so they'd be shown
+    # as plain links until the classify_song_links command is run
+    SongLink = apps.get_model('sbsong', 'SongLink')
+    for songlink in SongLink.objects.only('link').iterator():
+        provider, embed_link = links.classify(songlink.link)
+        if provider:
+            SongLink.objects.filter(pk=songlink.pk).update(
+                provider=provider, embed_link=embed_link
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sbsong', '0009_song_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(classify_song_links,
+                             migrations.RunPython.noop),
+    ]
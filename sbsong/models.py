@@ -5,6 +5,9 @@ from django.utils.translation import ugettext_noop
 from django.core.urlresolvers import reverse
 from django.core import validators
 
+from songbook.markup import MarkdownFieldsMixin
+from songbook.tracking import DirtyFieldsMixin
+from sbsong import links
 import sbgig.models
 
 
@@ -20,7 +23,10 @@ class Instrument(models.Model):
         return self.name
 
 
-class Song(models.Model):
+class Song(MarkdownFieldsMixin, DirtyFieldsMixin, models.Model):
+    markdown_fields = ('description', )
+    version_field = 'version'
+
     gig = models.ForeignKey(sbgig.models.Gig, on_delete=models.CASCADE,
                             blank=True, null=True, related_name='songs')
     suggested_by = models.ForeignKey(User, on_delete=models.PROTECT,
@@ -37,25 +43,21 @@ class Song(models.Model):
                               max_length=100, null=False, blank=True)
     description = models.TextField(verbose_name=_("Description"),
                                    null=False, blank=True)
+    description_html = models.TextField(null=True, blank=True,
+                                        editable=False)
     lyrics = models.TextField(null=False, blank=True)
     staffed = models.BooleanField(null=False, blank=False, default=False)
     readiness = models.PositiveSmallIntegerField(
         blank=False, default=0, validators=[validators.MaxValueValidator(100)]
     )
+    # incremented with every change of the song, its parts and links
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         index_together = [
             ('gig', 'staffed'),
         ]
 
-    def __init__(self, *args, **kwargs):
-        super(Song, self).__init__(*args, **kwargs)
-        self._pristine = {
-            field: getattr(self, field)
-            for field in ('title', 'artist', 'description',
-                          'lyrics', 'staffed')
-        }
-
     def __str__(self):
         if self.artist:
             return "%s (by %s)" % (self.title, self.artist)
@@ -66,6 +68,43 @@ class Song(models.Model):
         return reverse('sbsong:view-song', args=[self.id])
 
 
+class SongStaffing(models.Model):
+    """
+    Summary of song parts and their performers, maintained
+    by ``sbsong.staffing``.
+    """
+    song = models.OneToOneField(Song, on_delete=models.CASCADE,
+                                primary_key=True, related_name='staffing')
+    num_required_parts = models.PositiveSmallIntegerField(default=0)
+    num_optional_parts = models.PositiveSmallIntegerField(default=0)
+    num_empty_required_parts = models.PositiveSmallIntegerField(default=0)
+    # comma separated ids of parts without performers
+    empty_part_ids = models.TextField(null=False, blank=True, default='')
+    # average of best readiness of required parts
+    readiness = models.PositiveSmallIntegerField(default=0)
+
+    @property
+    def staffed(self):
+        return (self.num_required_parts > 0
+                and self.num_empty_required_parts == 0)
+
+    def get_empty_part_ids(self):
+        return [int(part_id) for part_id in self.empty_part_ids.split(',')
+                if part_id]
+
+    def set_empty_part_ids(self, part_ids):
+        self.empty_part_ids = ','.join(str(part_id) for part_id in part_ids)
+
+    def as_dict(self):
+        return {
+            'num_required_parts': self.num_required_parts,
+            'num_optional_parts': self.num_optional_parts,
+            'num_empty_required_parts': self.num_empty_required_parts,
+            'empty_part_ids': self.empty_part_ids,
+            'readiness': self.readiness,
+        }
+
+
 class SongWatcher(models.Model):
     song = models.ForeignKey(Song, blank=False, related_name='watchers',
                              on_delete=models.CASCADE)
@@ -85,6 +124,16 @@ class SongLink(models.Model):
     link = models.URLField(null=False, blank=False, verbose_name=_("Link"))
     notice = models.CharField(max_length=150, null=False, blank=True,
                               verbose_name=_("Notice"))
+    provider = models.CharField(max_length=20, null=False, blank=True,
+                                editable=False)
+    embed_link = models.URLField(null=False, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.provider, self.embed_link = links.classify(self.link)
+        super(SongLink, self).save(*args, **kwargs)
+
+    def get_provider(self):
+        return links.get_provider(self.provider)
 
     def __str__(self):
         link = self.link
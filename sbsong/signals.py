@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+import sbsong.conditional
+import sbsong.models
+import sbsong.staffing
+
+
+@receiver(post_save, sender=sbsong.models.Song)
+def song_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        sbsong.models.SongStaffing.objects.create(song=instance)
+
+
+@receiver([post_save, post_delete], sender=sbsong.models.SongPart)
+def part_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sbsong.staffing.refresh(instance.song_id)
+
+
+@receiver([post_save, post_delete], sender=sbsong.models.SongPerformer)
+def performer_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    try:
+        song_id = instance.part.song_id
+    except sbsong.models.SongPart.DoesNotExist:
+        # the part is being deleted along with its performers
+        return
+    sbsong.staffing.refresh(song_id)
+
+
+@receiver([post_save, post_delete], sender=sbsong.models.SongLink)
+def link_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sbsong.models.Song.objects.filter(pk=instance.song_id).update(
+            version=F('version') + 1
+        )
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    # users are listed by username in join forms of song pages; logins
+    # only save last_login
+    if raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    sbsong.conditional.invalidate_performers()
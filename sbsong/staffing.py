@@ -0,0 +1,188 @@
+"""
+Maintenance of ``SongStaffing``, the per-song summary of parts
+and performers.
+
+A summary is refreshed by ``sbsong.signals`` whenever a part or
+a performer of its song is saved or deleted, and ``staffed`` and
+``readiness`` columns of the song are updated along with it, and its
+``version`` is incremented. Rows
+created or removed in bulk must be followed by ``rebuild()`` or,
+to fix the columns of songs too, ``recompute_song_stats()``.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Max
+
+from sbsong import models
+
+
+def compute(song_ids):
+    """
+    Return unsaved ``SongStaffing`` instances for given songs.
+    """
+    return _compute(song_ids,
+                    models.SongPart.objects.filter(song_id__in=song_ids))
+
+
+def _compute(song_ids, parts):
+    # parts of all the songs are aggregated in one query
+    parts = parts.annotate(num_perf=Count('songperformer'),
+                           best_readiness=Max('songperformer__readiness'))
+    parts = parts.order_by('song_id', 'id').values_list(
+        'id', 'song_id', 'required', 'num_perf', 'best_readiness'
+    )
+    parts_by_song_id = defaultdict(list)
+    for part in parts:
+        parts_by_song_id[part[1]].append(part)
+    return [summarize(song_id, parts_by_song_id[song_id])
+            for song_id in song_ids]
+
+
+def summarize(song_id, parts):
+    """
+    Return unsaved ``SongStaffing`` of the song with given parts, which
+    are ``(id, song_id, required, num_perf, best_readiness)`` tuples.
+    """
+    staffing = models.SongStaffing(song_id=song_id)
+    empty_part_ids = []
+    readiness_sum = 0
+    for part_id, part_song_id, required, num_perf, best_readiness in parts:
+        if required:
+            staffing.num_required_parts += 1
+            readiness_sum += best_readiness or 0
+            if not num_perf:
+                staffing.num_empty_required_parts += 1
+        else:
+            staffing.num_optional_parts += 1
+        if not num_perf:
+            empty_part_ids.append(part_id)
+    staffing.set_empty_part_ids(empty_part_ids)
+    if staffing.num_required_parts:
+        staffing.readiness = int(readiness_sum /
+                                 staffing.num_required_parts)
+    return staffing
+
+
+def get(song_id):
+    """
+    Return the summary of the song, building it if it's missing.
+    """
+    try:
+        return models.SongStaffing.objects.get(song_id=song_id)
+    except models.SongStaffing.DoesNotExist:
+        [staffing] = compute([song_id])
+        staffing.save()
+        return staffing
+
+
+def refresh(song_id):
+    """
+    Update the summary of the song and the song's ``staffed``,
+    ``readiness`` and ``version``.
+
+    Summary is only updated, not created: it's created together with
+    the song, and a missing one means the song is being deleted.
+    """
+    [staffing] = compute([song_id])
+    models.SongStaffing.objects.filter(song_id=song_id).update(
+        **staffing.as_dict()
+    )
+    models.Song.objects.filter(pk=song_id).update(
+        staffed=staffing.staffed, readiness=staffing.readiness,
+        version=F('version') + 1
+    )
+    return staffing
+
+
+def rebuild(song_ids=None, *, batch_size=500, dry_run=False):
+    """
+    Recompute summaries of given songs (all by default), creating missing
+    ones. Return ids of songs whose summaries were missing or stale.
+    """
+    if song_ids is None:
+        song_ids = models.Song.objects.values_list('id', flat=True)
+    song_ids = sorted(song_ids)
+    changed = []
+    for batch in _batches(song_ids, batch_size):
+        existing = models.SongStaffing.objects.in_bulk(batch)
+        stale = [staffing for staffing in compute(batch)
+                 if staffing.song_id not in existing
+                 or existing[staffing.song_id].as_dict()
+                 != staffing.as_dict()]
+        changed.extend(staffing.song_id for staffing in stale)
+        if dry_run or not stale:
+            continue
+        for staffing in stale:
+            staffing.save()
+        models.Song.objects.filter(
+            id__in=[staffing.song_id for staffing in stale]
+        ).update(version=F('version') + 1)
+    return changed
+
+
+def recompute_song_stats(song_ids=None, *, dry_run=False):
+    """
+    Recompute summaries of given songs (all by default) together with
+    ``staffed`` and ``readiness`` of the songs, e.g. after an import.
+    Return ids of songs whose summaries or columns were inconsistent.
+
+    Unlike ``rebuild()`` this doesn't save songs one by one: songs
+    with the same new values are updated by a single query.
+    """
+    if song_ids is None:
+        return _recompute(models.Song.objects.all(),
+                          models.SongPart.objects.all(), dry_run)
+    changed = []
+    for batch in _batches(sorted(song_ids)):
+        changed.extend(_recompute(
+            models.Song.objects.filter(id__in=batch),
+            models.SongPart.objects.filter(song_id__in=batch), dry_run
+        ))
+    return changed
+
+
+def _recompute(songs, parts, dry_run):
+    columns = {song_id: (staffed, readiness)
+               for song_id, staffed, readiness
+               in songs.values_list('id', 'staffed', 'readiness')}
+    existing = {
+        staffing.song_id: staffing.as_dict()
+        for staffing in models.SongStaffing.objects.filter(song__in=songs)
+    }
+    stale = []
+    song_ids_by_columns = defaultdict(list)
+    for staffing in _compute(sorted(columns), parts):
+        if existing.get(staffing.song_id) != staffing.as_dict():
+            stale.append(staffing)
+        new_columns = (staffing.staffed, staffing.readiness)
+        if columns[staffing.song_id] != new_columns:
+            song_ids_by_columns[new_columns].append(staffing.song_id)
+    changed = {staffing.song_id for staffing in stale}
+    for song_ids in song_ids_by_columns.values():
+        changed.update(song_ids)
+    if dry_run:
+        return sorted(changed)
+    stale_ids = [staffing.song_id for staffing in stale]
+    for batch in _batches(stale_ids):
+        models.SongStaffing.objects.filter(song_id__in=batch).delete()
+    models.SongStaffing.objects.bulk_create(stale)
+    for (staffed, readiness), song_ids in song_ids_by_columns.items():
+        for batch in _batches(song_ids):
+            models.Song.objects.filter(id__in=batch).update(
+                staffed=staffed, readiness=readiness,
+                version=F('version') + 1
+            )
+    # songs with stale summaries only show differently too
+    updated = {song_id for song_ids in song_ids_by_columns.values()
+               for song_id in song_ids}
+    for batch in _batches(sorted(changed - updated)):
+        models.Song.objects.filter(id__in=batch).update(
+            version=F('version') + 1
+        )
+    return sorted(changed)
+
+
+def _batches(ids, size=500):
+    # SQLite limits the number of query parameters
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
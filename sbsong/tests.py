@@ -0,0 +1,284 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+import sbcomment.actions
+import sbgig.models
+import sbsong.copying
+import sbsong.models
+import sbsong.staffing
+import sbuser.models
+
+
+class SongStaffingTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                              date=date.today())
+        cls.song = sbsong.models.Song.objects.create(
+            gig=gig, title='Song', suggested_by=cls.user, changed_by=cls.user
+        )
+        instrument = sbsong.models.Instrument.objects.create(name='Guitar')
+        [cls.part, cls.other_part] = [
+            sbsong.models.SongPart.objects.create(
+                song=cls.song, instrument=instrument, required=True
+            )
+            for idx in range(2)
+        ]
+
+    def test_summaries_follow_parts_and_performers(self):
+        staffing = sbsong.models.SongStaffing.objects.get(song=self.song)
+        self.assertCountEqual(staffing.get_empty_part_ids(),
+                              [self.part.id, self.other_part.id])
+
+        performer = sbsong.models.SongPerformer.objects.create(
+            part=self.part, performer=self.user
+        )
+        staffing.refresh_from_db()
+        self.assertEqual(staffing.get_empty_part_ids(), [self.other_part.id])
+
+        performer.delete()
+        self.other_part.delete()
+        staffing.refresh_from_db()
+        self.assertEqual(staffing.get_empty_part_ids(), [self.part.id])
+        self.assertEqual(sbsong.staffing.rebuild(dry_run=True), [])
+
+
+class SongStatsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                              date=date.today())
+        song = sbsong.models.Song.objects.create(
+            gig=gig, title='Song', suggested_by=cls.user, changed_by=cls.user
+        )
+        instrument = sbsong.models.Instrument.objects.create(name='Guitar')
+        cls.part = sbsong.models.SongPart.objects.create(
+            song=song, instrument=instrument, required=True
+        )
+        sbsong.models.SongPerformer.objects.create(
+            part=cls.part, performer=cls.user, readiness=50
+        )
+
+    def setUp(self):
+        self.song = sbsong.models.Song.objects.get(pk=self.part.song_id)
+
+    def test_songs_follow_parts_and_performers(self):
+        self.assertEqual((self.song.staffed, self.song.readiness), (True, 50))
+        self.part.songperformer_set.all().delete()
+        self.song.refresh_from_db()
+        self.assertFalse(self.song.staffed)
+        sbsong.models.SongPerformer.objects.create(
+            part=self.part, performer=self.user, readiness=100
+        )
+        self.song.refresh_from_db()
+        self.assertTrue(self.song.staffed)
+        self.assertEqual(self.song.readiness, 100)
+        self.assertEqual(self.song.readiness, self.song.staffing.readiness)
+
+    def test_recompute_song_stats(self):
+        song = self.song
+        sbsong.models.Song.objects.filter(pk=song.pk).update(
+            staffed=not song.staffed, readiness=(song.readiness + 1) % 100
+        )
+        sbsong.models.SongStaffing.objects.filter(song=song).delete()
+        self.assertEqual(
+            sbsong.staffing.recompute_song_stats(dry_run=True), [song.id]
+        )
+        self.assertEqual(sbsong.staffing.recompute_song_stats(), [song.id])
+        self.assertEqual(sbsong.staffing.recompute_song_stats(), [])
+        self.assertEqual(sbsong.models.Song.objects.get(pk=song.pk).staffed,
+                         song.staffed)
+
+
+class SongPageConditionalGetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        [cls.user, cls.other_user] = [
+            User.objects.create(username=username)
+            for username in ('user', 'other')
+        ]
+        for user in (cls.user, cls.other_user):
+            sbuser.models.Profile.objects.create(
+                user=user, password_change_required=False
+            )
+        gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                              date=date.today())
+        cls.song = sbsong.models.Song.objects.create(
+            gig=gig, title='Song', suggested_by=cls.user, changed_by=cls.user
+        )
+        instrument = sbsong.models.Instrument.objects.create(name='Guitar')
+        part = sbsong.models.SongPart.objects.create(
+            song=cls.song, instrument=instrument, required=True
+        )
+        sbsong.models.SongPerformer.objects.create(part=part,
+                                                   performer=cls.other_user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('sbsong:view-song', args=[self.song.id])
+
+    def assertNotModifiedUntilChanged(self, url, change):
+        # the clock is stopped, so changes must show in more than timestamps
+        now = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_follows_comments(self):
+        self.assertNotModifiedUntilChanged(
+            self.url,
+            lambda: sbcomment.actions.song_comment_written(
+                self.song, self.user, "Hi"
+            )
+        )
+
+    def test_follows_edits_at_same_time(self):
+        def edit():
+            song = sbsong.models.Song.objects.get(pk=self.song.pk)
+            song.title = 'New title'
+            song.save()
+        self.assertNotModifiedUntilChanged(self.url, edit)
+
+    def test_follows_renamed_users(self):
+        def rename():
+            self.other_user.username = 'renamed'
+            self.other_user.save()
+        self.assertNotModifiedUntilChanged(self.url, rename)
+
+
+class CopySongsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        [cls.user, other_user] = [User.objects.create(username=username)
+                                  for username in ('user', 'other')]
+        today = date.today()
+        cls.gig = sbgig.models.Gig.objects.create(
+            title='Gig', slug='gig', date=today - timedelta(days=30)
+        )
+        # songs can only be copied to gigs which are not over
+        cls.target_gig = sbgig.models.Gig.objects.create(
+            title='Next gig', slug='next-gig', date=today
+        )
+        instruments = [sbsong.models.Instrument.objects.create(name=name)
+                       for name in ('Guitar', 'Drums')]
+        for idx in range(2):
+            song = sbsong.models.Song.objects.create(
+                gig=cls.gig, title='Song %d' % idx, suggested_by=other_user,
+                changed_by=other_user
+            )
+            # the latter part is left without performers
+            [part, empty_part] = [
+                sbsong.models.SongPart.objects.create(
+                    song=song, instrument=instrument, required=True
+                )
+                for instrument in instruments
+            ]
+            sbsong.models.SongPerformer.objects.create(
+                part=part, performer=other_user, readiness=50
+            )
+            sbsong.models.SongLink.objects.create(
+                song=song, link='http://example.com/%d' % idx
+            )
+            sbsong.models.SongWatcher.objects.create(song=song,
+                                                     user=other_user)
+
+    def test_copies_songs_with_parts_and_performers(self):
+        songs = list(self.gig.songs.order_by('id'))
+        copies = sbsong.copying.copy_songs(songs, self.target_gig,
+                                           self.user, copy_participants=True)
+        self.assertEqual(len(copies), 2)
+        for song, copy in zip(songs, copies):
+            self.assertEqual(copy.gig, self.target_gig)
+            self.assertEqual(copy.title, song.title)
+            # parts without performers come with None
+            self.assertCountEqual(
+                copy.parts.values_list('instrument',
+                                       'songperformer__performer'),
+                song.parts.values_list('instrument',
+                                       'songperformer__performer')
+            )
+            self.assertEqual(sbsong.models.SongStaffing.objects.get(
+                song=copy
+            ).as_dict()['readiness'], song.staffing.readiness)
+            self.assertFalse(copy.links.exists())
+
+    def test_watchers_have_seen_copies(self):
+        copies = sbsong.copying.copy_songs(
+            list(self.gig.songs.order_by('id')), self.target_gig, self.user
+        )
+        watchers = sbsong.models.SongWatcher.objects.filter(
+            song__in=copies
+        ).select_related('song')
+        self.assertTrue(watchers.exists())
+        for watcher in watchers:
+            self.assertGreaterEqual(watcher.last_seen, watcher.song.changed_at)
+
+
+class CopySongViewTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user')
+        sbuser.models.Profile.objects.create(user=cls.user,
+                                             password_change_required=False)
+        today = date.today()
+        cls.gig = sbgig.models.Gig.objects.create(
+            title='Gig', slug='gig', date=today - timedelta(days=30)
+        )
+        cls.target_gig = sbgig.models.Gig.objects.create(
+            title='Next gig', slug='next-gig', date=today
+        )
+        cls.instrument = sbsong.models.Instrument.objects.create(
+            name='Guitar'
+        )
+        cls.songs = []
+        for idx in range(2):
+            song = sbsong.models.Song.objects.create(
+                gig=cls.gig, title='Song %d' % idx, suggested_by=cls.user,
+                changed_by=cls.user
+            )
+            cls.add_part(song)
+            cls.songs.append(song)
+
+    @classmethod
+    def add_part(cls, song):
+        part = sbsong.models.SongPart.objects.create(
+            song=song, instrument=cls.instrument, required=True
+        )
+        sbsong.models.SongPerformer.objects.create(
+            part=part, performer=cls.user, readiness=50
+        )
+
+    def _count_copy_song_queries(self, song):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('sbsong:copy-song', args=[song.id]),
+                {'target_gig': self.target_gig.id, 'copy_links': 'on',
+                 'copy_participants': 'on'}
+            )
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_copy_song_queries_dont_depend_on_parts(self):
+        [small_song, big_song] = self.songs
+        for idx in range(10):
+            self.add_part(big_song)
+        self.assertEqual(self._count_copy_song_queries(small_song),
+                         self._count_copy_song_queries(big_song))
+        copy = self.target_gig.songs.order_by('-id').first()
+        staffing = sbsong.models.SongStaffing.objects.get(song=big_song)
+        self.assertEqual((copy.staffed, copy.readiness),
+                         (staffing.staffed, staffing.readiness))
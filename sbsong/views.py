@@ -6,16 +6,25 @@ from django.contrib import messages
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
+from django.views.decorators.http import condition
 
 from sbsong import forms
 from sbsong import models
+import sbsong.conditional
+import sbsong.copying
 import sbgig.models
 import sbcomment.actions
+import sbcomment.paging
 
 
 @login_required
 def suggest_a_song(request, gigslug):
-    gig = get_object_or_404(sbgig.models.Gig, slug=gigslug)
+    gigs = sbgig.models.Gig.objects.all()
+    if request.method == 'POST':
+        # songs added to the gig are serialized with copies read back
+        # by songbook.bulk
+        gigs = gigs.select_for_update()
+    gig = get_object_or_404(gigs, slug=gigslug)
     if request.method == 'POST':
         form = forms.SongForm(request.POST)
         if form.is_valid():
@@ -34,6 +43,8 @@ def suggest_a_song(request, gigslug):
 
 
 @login_required
+@condition(etag_func=sbsong.conditional.song_etag,
+           last_modified_func=sbsong.conditional.song_last_modified)
 def view_song(request, song_id):
     song = get_object_or_404(models.Song, pk=song_id)
 
@@ -63,7 +74,9 @@ def view_song(request, song_id):
 
     songwatcher = song.watchers.filter(user=request.user).first()
     last_seen = None
-    comments = song.comments.all()[:settings.SB_COMMENTS_ON_PAGE + 1]
+    comments = sbcomment.paging.get_page(
+        song.gig, song, limit=settings.SB_COMMENTS_ON_PAGE + 1
+    )
     num_unread_comments = 0
     if songwatcher:
         num_unread_comments = song.comments.filter(
@@ -148,6 +161,10 @@ def join_song_part(request, part_id):
         form_cls = forms.JoinSongPartForm
     join_part_form = form_cls(request.POST)
     if join_part_form.is_valid():
+        # the song is loaded before the change, see sbcomment.actions
+        part = get_object_or_404(
+            models.SongPart.objects.select_related('song'), pk=part_id
+        )
         old_performers = list(
             models.SongPerformer.objects.filter(part_id=part_id)
         )
@@ -159,12 +176,12 @@ def join_song_part(request, part_id):
             defaults=join_part_form.cleaned_data
         )
         if created:
-            sbcomment.actions.joined_part(songperf.performer, songperf.part,
+            sbcomment.actions.joined_part(songperf.performer, part,
                                           old_performers,
                                           changed_by=request.user)
         else:
             sbcomment.actions.edited_part_participation(
-                request.user, songperf.part, old_performers
+                request.user, part, old_performers
             )
     return JsonResponse({'result': 'ok'})
 
@@ -172,9 +189,9 @@ def join_song_part(request, part_id):
 @login_required
 def kick_from_song_part(request, part_id, performer_id):
     try:
-        songperf = models.SongPerformer.objects.get(
-            part_id=part_id, performer=performer_id
-        )
+        songperf = models.SongPerformer.objects.select_related(
+            'part__song', 'performer'
+        ).get(part_id=part_id, performer=performer_id)
     except models.SongPerformer.DoesNotExist:
         pass
     else:
@@ -191,18 +208,21 @@ def kick_from_song_part(request, part_id, performer_id):
 def add_song_part(request, song_id):
     form = forms.SongPartForm(request.POST)
     if form.is_valid():
-        old_parts = list(models.SongPart.objects.filter(song_id=song_id))
+        song = get_object_or_404(models.Song, pk=song_id)
+        old_parts = list(song.parts.all())
         new_part = form.save(commit=False)
-        new_part.song_id = song_id
+        new_part.song = song
         new_part.save()
-        sbcomment.actions.added_part(request.user, new_part.song, old_parts)
+        sbcomment.actions.added_part(request.user, song, old_parts)
     return JsonResponse({'result': 'ok'})
 
 
 @login_required
 def remove_song_part(request, part_id):
     try:
-        removed_part = models.SongPart.objects.get(pk=part_id)
+        removed_part = models.SongPart.objects.select_related('song').get(
+            pk=part_id
+        )
     except models.SongPart.DoesNotExist:
         pass
     else:
@@ -264,40 +284,12 @@ def copy_song(request, song_id):
     if gig == song.gig:
         return HttpResponse(status=400)
 
-    parts = {part.id: part for part in song.parts.all()}
-    links = list(song.links.all())
-    songperfs = list(models.SongPerformer.objects.filter(part__song=song))
-    watchers = list(song.watchers.all())
-
-    song.pk = None
-    prev_gig = song.gig
-    song.gig = gig
-    song.suggested_by = request.user
-    song.save()
-
-    for part in parts.values():
-        part.pk = None
-        part.song = song
-        part.save()
-
-    for watcher in watchers:
-        watcher.pk = None
-        watcher.song = song
-        watcher.save()
-
-    if form.cleaned_data['copy_participants']:
-        for perf in songperfs:
-            perf.part = parts[perf.part_id]
-            perf.pk = None
-            perf.save()
-
-    if form.cleaned_data['copy_links']:
-        for link in links:
-            link.pk = None
-            link.song = song
-            link.save()
-
-    sbcomment.actions.song_copied(request.user, song, prev_gig, song_id)
+    [copy] = sbsong.copying.copy_songs(
+        [song], gig, request.user,
+        copy_participants=form.cleaned_data['copy_participants'],
+        copy_links=form.cleaned_data['copy_links']
+    )
+    sbcomment.actions.song_copied(request.user, copy, song)
 
     return HttpResponseRedirect(reverse('sbsong:view-song',
-                                        args=[song.pk]))
+                                        args=[copy.pk]))
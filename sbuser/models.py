@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
 
+from songbook.markup import MarkdownFieldsMixin
 import sbsong.models
 
 
@@ -20,7 +21,9 @@ class UserPlays(models.Model):
         ]
 
 
-class Profile(models.Model):
+class Profile(MarkdownFieldsMixin, models.Model):
+    markdown_fields = ('about_myself', )
+
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     gender = models.CharField(max_length=1, choices=[
         ('f', _("Female")),
@@ -28,6 +31,8 @@ class Profile(models.Model):
     ], default='m', verbose_name=_("Gender"))
     about_myself = models.TextField(verbose_name=_("About myself"),
                                     blank=True, null=False)
+    about_myself_html = models.TextField(null=True, blank=True,
+                                         editable=False)
     password_change_required = models.BooleanField(default=True)
 
     def __str__(self):
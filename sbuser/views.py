@@ -40,7 +40,8 @@ def view_profile(request, username):
         (instrument, user_plays.get(instrument.id))
         for instrument in sbsong.models.Instrument.objects.all()
     ]
-    comments = user.comments.order_by('-datetime')[:5]
+    comments = user.comments.prefetch_related('changes') \
+                            .order_by('-datetime')[:5]
     is_editable = (user == request.user or request.user.is_superuser)
 
     upcoming_gigs = sbsong.models.SongPerformer.objects.filter(
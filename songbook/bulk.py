@@ -0,0 +1,29 @@
+"""
+Bulk inserts which need primary keys of created rows.
+"""
+from django.db import connection, transaction
+
+
+def create_and_fetch(model, objs, *, lock=None, **scope):
+    """
+    Insert ``objs`` with a single ``bulk_create()`` and return them with
+    primary keys, in the order they were given.
+
+    Backends which return primary keys of bulk inserts get the objects
+    back as they are. Elsewhere rows matching ``scope`` which are newer
+    than the latest existing one are read back, so no other rows may
+    be added to the scope until the transaction ends: rows of ``lock``,
+    a queryset of what owns the scope, are locked for update first,
+    and any other writer of the scope must lock them as well. A scope
+    of rows created earlier in the same transaction needs no lock.
+    """
+    if getattr(connection.features, 'can_return_ids_from_bulk_insert',
+               False):
+        return model.objects.bulk_create(objs)
+    with transaction.atomic():
+        if lock is not None:
+            list(lock.select_for_update().values_list('pk', flat=True))
+        qs = model.objects.filter(**scope)
+        max_id = qs.order_by('-id').values_list('id', flat=True).first() or 0
+        model.objects.bulk_create(objs)
+        return list(qs.filter(id__gt=max_id).order_by('id'))
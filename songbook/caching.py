@@ -0,0 +1,48 @@
+import hashlib
+
+from jinja2.utils import LRUCache
+
+from songbook import perf
+
+
+def text_digest(*texts):
+    """
+    Return a hex digest identifying the given sequence of strings.
+
+    >>> text_digest('foo') == text_digest('foo')
+    True
+    >>> text_digest('foo', 'bar') == text_digest('foob', 'ar')
+    False
+    """
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class MemoCache:
+    """
+    Bounded in-process memo for results of pure functions.
+
+    Least recently used entries are evicted once ``capacity`` is reached.
+    """
+    def __init__(self, name, capacity):
+        self.name = name
+        self._cache = LRUCache(capacity)
+
+    def get_or_compute(self, key, compute):
+        try:
+            value = self._cache[key]
+        except KeyError:
+            pass
+        else:
+            perf.record_cache(self.name, True)
+            return value
+        perf.record_cache(self.name, False)
+        value = compute()
+        self._cache[key] = value
+        return value
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,52 @@
+"""
+Helpers for cheap ETag validators of pages.
+
+A validator is computed by the ``condition`` view decorator from a few
+aggregate queries, so an unchanged page is answered with 304 before
+the view runs. Besides the page's own data, every validator covers
+what ``base.html`` renders for the particular request.
+"""
+import hashlib
+
+from django.contrib.messages.api import get_messages
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils import translation
+
+import sbgig.jinja2env
+
+
+def page_etag(request, *parts, relative_times=True):
+    """
+    Return ETag of a page of the requesting user showing data identified
+    by ``parts``, or None if the page must be rendered anyway.
+
+    Pages with ``relative_times`` ("5 minutes ago") change every minute.
+    """
+    if len(get_messages(request)):
+        # pending messages are shown once, so the page must be rendered
+        return None
+    digest = hashlib.sha1()
+    common = [
+        request.user.pk,
+        translation.get_language(),
+        timezone.get_current_timezone_name(),
+        # forms embed the token; a request without the cookie gets
+        # the one set along with this response, so it's known already
+        get_token(request),
+        sbgig.jinja2env.gig_menu(),
+    ]
+    if relative_times:
+        common.append(int(timezone.now().timestamp() // 60))
+    for part in common + list(parts):
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def latest(*datetimes):
+    """
+    Return the latest of given datetimes ignoring Nones, or None.
+    """
+    datetimes = [dt for dt in datetimes if dt is not None]
+    return max(datetimes) if datetimes else None
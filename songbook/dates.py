@@ -0,0 +1,102 @@
+"""
+Cached babel formatters used by date and time template filters.
+
+Babel parses the locale and looks up and compiles the pattern on every
+``format_*`` call. Here it's done once per (locale, format, timezone).
+Relative time deltas are memoized by the bucket babel rounds them to,
+so all deltas rendered as e.g. "5 minutes ago" share a cache entry.
+"""
+import functools
+
+import babel.core
+import babel.dates
+import pytz
+
+from songbook.caching import MemoCache
+
+
+_STANDARD_FORMATS = ('full', 'long', 'medium', 'short')
+
+
+@functools.lru_cache(maxsize=None)
+def get_locale(locale):
+    return babel.core.Locale.parse(locale)
+
+
+class DateFormatter:
+    """
+    Produces the same output as ``babel.dates.format_date()``
+    and ``babel.dates.format_datetime()`` with given arguments.
+    """
+    def __init__(self, locale, format, tzinfo):
+        self.locale = get_locale(locale)
+        self.tzinfo = tzinfo
+        self.datetime_format = None
+        if format in _STANDARD_FORMATS:
+            self.date_pattern = babel.dates.parse_pattern(
+                babel.dates.get_date_format(format, locale=self.locale)
+            )
+            self.time_pattern = babel.dates.parse_pattern(
+                babel.dates.get_time_format(format, locale=self.locale)
+            )
+            self.datetime_format = babel.dates.get_datetime_format(
+                format, locale=self.locale
+            ).replace("'", "")
+        else:
+            self.date_pattern = babel.dates.parse_pattern(format)
+            self.datetime_pattern = self.date_pattern
+
+    def format_date(self, date):
+        if hasattr(date, 'date'):
+            date = date.date()
+        return self.date_pattern.apply(date, self.locale)
+
+    def format_datetime(self, dt):
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=pytz.utc)
+        if self.tzinfo is not None:
+            dt = dt.astimezone(self.tzinfo)
+            if hasattr(self.tzinfo, 'normalize'):
+                dt = self.tzinfo.normalize(dt)
+        if self.datetime_format is None:
+            return self.datetime_pattern.apply(dt, self.locale)
+        time = self.time_pattern.apply(dt.timetz(), self.locale)
+        date = self.date_pattern.apply(dt.date(), self.locale)
+        return self.datetime_format.replace('{0}', time).replace('{1}', date)
+
+
+@functools.lru_cache(maxsize=256)
+def get_date_formatter(locale, format='medium', tzinfo=None):
+    return DateFormatter(locale, format, tzinfo)
+
+
+def timedelta_bucket(seconds, granularity='second', threshold=.85):
+    """
+    Return (unit, rounded value, direction) which is all that babel's
+    ``format_timedelta()`` output depends on.
+
+    >>> timedelta_bucket(-150)
+    ('minute', 2, False)
+    >>> timedelta_bucket(3600 * 24 * 6)
+    ('week', 1, True)
+    """
+    for unit, secs_per_unit in babel.dates.TIMEDELTA_UNITS:
+        value = abs(seconds) / secs_per_unit
+        if value >= threshold or unit == granularity:
+            if unit == granularity and value > 0:
+                value = max(1, value)
+            return unit, int(round(value)), seconds >= 0
+    return None
+
+
+_timedelta_cache = MemoCache('timedelta', 1000)
+
+
+def format_timedelta(delta, locale):
+    seconds = int(delta.days * 86400 + delta.seconds)
+    key = (locale, timedelta_bucket(seconds))
+    return _timedelta_cache.get_or_compute(
+        key, lambda: babel.dates.format_timedelta(
+            seconds, add_direction=True, locale=get_locale(locale)
+        )
+    )
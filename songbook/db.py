@@ -0,0 +1,79 @@
+"""
+Database routing and transaction policy of views.
+
+Views which only read are decorated with ``read_only``. They run outside
+of the request transaction (``ATOMIC_REQUESTS``), so every query holds
+a lock only for as long as it runs. Their reads go to the database named
+by ``SB_READ_DATABASE`` if it's set, which is a replica or a second
+connection to the same SQLite database kept read-only. Writes always go
+to the default database, within the transactions of views which write.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.backends.signals import connection_created
+
+
+_local = threading.local()
+
+
+@contextmanager
+def reading_from_replica():
+    """
+    Route reads of the current thread to ``SB_READ_DATABASE``.
+    """
+    previous = getattr(_local, 'read_only', False)
+    _local.read_only = True
+    try:
+        yield
+    finally:
+        _local.read_only = previous
+
+
+def read_only(view):
+    """
+    Decorate view which doesn't write to the database, except incidental
+    writes which don't need to be atomic with its reads.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with reading_from_replica():
+            return view(*args, **kwargs)
+    return transaction.non_atomic_requests(wrapper)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.SB_READ_DATABASE and getattr(_local, 'read_only', False):
+            return settings.SB_READ_DATABASE
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # executed on the raw connection, so they don't count as queries
+    # of whatever opened the connection
+    if settings.SB_SQLITE_JOURNAL_MODE:
+        # in WAL mode readers don't block writers and vice versa
+        connection.connection.execute('PRAGMA journal_mode=%s' %
+                                      settings.SB_SQLITE_JOURNAL_MODE)
+    if connection.alias == settings.SB_READ_DATABASE:
+        connection.connection.execute('PRAGMA query_only=ON')
+
+
+connection_created.connect(configure_connection,
+                           dispatch_uid='songbook.db')
@@ -0,0 +1,244 @@
+"""
+Diff engine behind ``textdiff`` and ``unidiff`` template filters.
+
+Opcodes backends take two sequences and a cost budget and return
+a list of ``difflib``-style opcodes, or ``None`` if sequences differ
+more than the budget allows. In that case (and if inputs are larger
+than ``max_size`` characters) the whole text is shown as replaced.
+"""
+from collections import Counter
+import difflib
+import re
+
+
+def sequence_matcher_opcodes(a, b, max_cost=None):
+    return difflib.SequenceMatcher(a=a, b=b).get_opcodes()
+
+
+def myers_opcodes(a, b, max_cost=None):
+    """
+    Find shortest edit script using Myers' O((N+M)D) algorithm.
+
+    Common suffix and prefix are stripped before the search, so a small
+    edit in a long text costs about as much as a linear scan.
+
+    >>> myers_opcodes('abcd', 'abxd')
+    [('equal', 0, 2, 0, 2), ('replace', 2, 3, 2, 3), ('equal', 3, 4, 3, 4)]
+    >>> myers_opcodes('abcd', 'bcde')
+    [('delete', 0, 1, 0, 0), ('equal', 1, 4, 0, 3), ('insert', 4, 4, 3, 4)]
+    >>> myers_opcodes('abcd', 'wxyz', max_cost=4) is None
+    True
+    """
+    n, m = len(a), len(b)
+    suffix = 0
+    while (suffix < n and suffix < m
+           and a[n - suffix - 1] == b[m - suffix - 1]):
+        suffix += 1
+    prefix = 0
+    while (prefix < n - suffix and prefix < m - suffix
+           and a[prefix] == b[prefix]):
+        prefix += 1
+    matches = _myers_matches(a[prefix:n - suffix], b[prefix:m - suffix],
+                             max_cost)
+    if matches is None:
+        return None
+    blocks = []
+    if prefix:
+        blocks.append((0, 0, prefix))
+    for i, j in matches:
+        i += prefix
+        j += prefix
+        if blocks and blocks[-1][0] + blocks[-1][2] == i \
+                and blocks[-1][1] + blocks[-1][2] == j:
+            blocks[-1] = (blocks[-1][0], blocks[-1][1], blocks[-1][2] + 1)
+        else:
+            blocks.append((i, j, 1))
+    if suffix:
+        blocks.append((n - suffix, m - suffix, suffix))
+    return _blocks_to_opcodes(blocks, n, m)
+
+
+def _myers_matches(a, b, max_cost):
+    n, m = len(a), len(b)
+    max_d = n + m
+    if max_cost is not None:
+        # every item without a counterpart in the other sequence costs
+        # an edit, which bounds the distance from below in linear time
+        common = sum((Counter(a) & Counter(b)).values())
+        if n + m - 2 * common > max_cost:
+            return None
+        max_d = min(max_d, max_cost)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _myers_backtrack(trace, n, m)
+        trace.append(v[offset - d:offset + d + 1])
+    return None
+
+
+def _myers_backtrack(trace, n, m):
+    matches = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        # trace[d - 1] holds diagonals from -(d - 1) to d - 1
+        prev_v = trace[d - 1]
+        offset = d - 1
+        k = x - y
+        if k == -d or (k != d and
+                       prev_v[offset + k - 1] < prev_v[offset + k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = prev_v[offset + prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            matches.append((x, y))
+        x, y = prev_x, prev_y
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        matches.append((x, y))
+    matches.reverse()
+    return matches
+
+
+def _blocks_to_opcodes(blocks, n, m):
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in blocks + [(n, m, 0)]:
+        if i < ai and j < bj:
+            opcodes.append(('replace', i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(('delete', i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(('insert', i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(('equal', ai, i, bj, j))
+    return opcodes
+
+
+def similarity(a, b):
+    """
+    Upper bound on the similarity ratio of two sequences, the same
+    as ``difflib.SequenceMatcher.quick_ratio()`` but without building
+    the matcher.
+
+    >>> similarity('abcd', 'bcde')
+    0.75
+    >>> similarity('', '')
+    1.0
+    """
+    if not a and not b:
+        return 1.0
+    matches = sum((Counter(a) & Counter(b)).values())
+    return 2.0 * matches / (len(a) + len(b))
+
+
+_words_re = re.compile(r'\S+|\s+')
+
+SAME_FMT = '<span class="same">%s</span>'
+REMOVED_FMT = '<span class="removed">%s</span>'
+ADDED_FMT = '<span class="added">%s</span>'
+
+
+class DiffEngine:
+    def __init__(self, opcodes=myers_opcodes, max_size=None, max_cost=None,
+                 words_min_similarity=0.7):
+        self._opcodes = opcodes
+        self.max_size = max_size
+        self.max_cost = max_cost
+        self.words_min_similarity = words_min_similarity
+
+    def opcodes(self, a, b):
+        opcodes = self._opcodes(a, b, self.max_cost)
+        if opcodes is None:
+            opcodes = [('replace', 0, len(a), 0, len(b))]
+        return opcodes
+
+    def _split_lines(self, prev, new):
+        if prev and not prev.endswith('\n'):
+            prev = prev + '\n'
+        if new and not new.endswith('\n'):
+            new = new + '\n'
+        return prev.splitlines(True), new.splitlines(True)
+
+    def _too_large(self, prev, new):
+        return (self.max_size is not None
+                and len(prev) + len(new) > self.max_size
+                and prev != new)
+
+    def textdiff(self, prev, new):
+        too_large = self._too_large(prev, new)
+        prev, new = self._split_lines(prev, new)
+        if too_large:
+            return self._replaced_block(prev, new)
+        result = []
+        opcodes_stack = [(iter(self.opcodes(prev, new)), prev, new, 'lines')]
+        while opcodes_stack:
+            opcodes, prev, new, scope = opcodes_stack[-1]
+            for opcode, i1, i2, j1, j2 in opcodes:
+                if opcode == 'equal':
+                    result.append(SAME_FMT % (''.join(new[j1:j2])))
+                elif opcode == 'delete':
+                    result.append(REMOVED_FMT % (''.join(prev[i1:i2])))
+                elif opcode == 'insert':
+                    result.append(ADDED_FMT % (''.join(new[j1:j2])))
+                elif opcode == 'replace':
+                    if scope == 'lines':
+                        prevwords = _words_re.findall(''.join(prev[i1:i2]))
+                        newwords = _words_re.findall(''.join(new[j1:j2]))
+                        if (similarity(prevwords, newwords)
+                                > self.words_min_similarity):
+                            opcodes = self.opcodes(prevwords, newwords)
+                            opcodes_stack.append((iter(opcodes), prevwords,
+                                                  newwords, 'words'))
+                            break
+                    result.append(REMOVED_FMT % (''.join(prev[i1:i2])))
+                    result.append(ADDED_FMT % (''.join(new[j1:j2])))
+            else:
+                opcodes_stack.pop()
+        return ''.join(result)
+
+    def _replaced_block(self, prev, new):
+        result = []
+        if prev:
+            result.append(REMOVED_FMT % ''.join(prev))
+        if new:
+            result.append(ADDED_FMT % ''.join(new))
+        return ''.join(result)
+
+    def unidiff(self, prev, new):
+        too_large = self._too_large(prev, new)
+        prev, new = self._split_lines(prev, new)
+        if too_large:
+            opcodes = [('replace', 0, len(prev), 0, len(new))]
+        else:
+            opcodes = self.opcodes(prev, new)
+        result = []
+        for opcode, i1, i2, j1, j2 in opcodes:
+            if opcode == 'equal':
+                for line in prev[i1:i2]:
+                    result.append(' ' + line)
+            elif opcode in {'replace', 'delete'}:
+                for line in prev[i1:i2]:
+                    result.append('-' + line)
+            if opcode in {'replace', 'insert'}:
+                for line in new[j1:j2]:
+                    result.append('+' + line)
+        return ''.join(result)
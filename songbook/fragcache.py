@@ -0,0 +1,91 @@
+"""
+Jinja2 extension caching rendered fragments of templates::
+
+    {% cache 'comment-body', comment.id, comment.seq %}
+      ...
+    {% endcache %}
+
+The first argument names the fragment, the rest identify the version of
+what it shows, so fragments are never invalidated, just not looked up
+anymore. Everything the fragment depends on must be among them, except
+the language and the timezone which are added to the key automatically.
+
+Fragments are kept by a backend set by ``SB_FRAGMENT_CACHE_BACKEND``,
+an in-process LRU cache by default.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils import translation
+from jinja2 import nodes, Markup
+from jinja2.ext import Extension
+from jinja2.utils import LRUCache
+
+from songbook import perf
+from songbook.caching import text_digest
+
+
+class LocalFragmentCache:
+    """
+    Keeps ``SB_FRAGMENT_CACHE_SIZE`` most recently used fragments
+    in the process.
+    """
+    def __init__(self):
+        self._cache = LRUCache(settings.SB_FRAGMENT_CACHE_SIZE)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache[key] = value
+
+
+class DjangoFragmentCache:
+    """
+    Keeps fragments in the default Django cache, shared by processes,
+    for ``SB_FRAGMENT_CACHE_TIMEOUT`` seconds.
+    """
+    def get(self, key):
+        return cache.get(key)
+
+    def set(self, key, value):
+        cache.set(key, value, settings.SB_FRAGMENT_CACHE_TIMEOUT)
+
+
+def fragment_key(name, parts):
+    return 'songbook:fragment:%s:%s' % (name, text_digest(
+        translation.get_language() or '',
+        timezone.get_current_timezone_name(),
+        *[repr(part) for part in parts]
+    ))
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        # set to a backend instance by songbook.jinja2env.environment()
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        parts = []
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [name, nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, name, parts, caller):
+        backend = self.environment.fragment_cache
+        if backend is None:
+            return caller()
+        key = fragment_key(name, parts)
+        fragment = backend.get(key)
+        perf.record_cache('fragment:%s' % name, fragment is not None)
+        if fragment is None:
+            fragment = caller()
+            backend.set(key, fragment)
+        return Markup(fragment)
@@ -1,6 +1,6 @@
+import os
 import re
-import json
-import difflib
+import time
 
 from django.contrib.messages.api import get_messages
 from django.contrib.staticfiles.storage import staticfiles_storage
@@ -10,13 +10,16 @@ from django.utils import translation
 from django.utils import timezone
 from django.utils.module_loading import import_string
 import jinja2
-import markdown
-import babel.dates
+
+from songbook import dates
+from songbook import perf
+from songbook.caching import MemoCache, text_digest
+from songbook.diff import DiffEngine
+from songbook.markup import render_markdown
 
 
 def markdown_safe(text):
-    md = markdown.Markdown(output_format='html5')
-    return jinja2.Markup(md.convert(jinja2.escape(text)))
+    return jinja2.Markup(render_markdown(text))
 
 
 def url(name, *args, **kwargs):
@@ -112,96 +115,45 @@ def _get_babel_locale():
 
 def format_datedelta(date):
     td = date - timezone.now().date()
-    return babel.dates.format_timedelta(td, add_direction=True,
-                                        locale=_get_babel_locale())
+    return dates.format_timedelta(td, _get_babel_locale())
 
 
 def format_timedelta(dt):
     td = dt - timezone.now()
-    return babel.dates.format_timedelta(td, add_direction=True,
-                                        locale=_get_babel_locale())
+    return dates.format_timedelta(td, _get_babel_locale())
 
 
 def format_date(date, format='medium'):
-    return babel.dates.format_date(date, format=format,
-                                   locale=_get_babel_locale())
+    formatter = dates.get_date_formatter(_get_babel_locale(), format)
+    return formatter.format_date(date)
 
 
 def format_datetime(dt, format='medium'):
     tz = timezone.get_current_timezone()
-    return babel.dates.format_datetime(dt, format=format,
-                                       locale=_get_babel_locale(), tzinfo=tz)
-
+    formatter = dates.get_date_formatter(_get_babel_locale(), format, tz)
+    return formatter.format_datetime(dt)
 
-def decode_json(data):
-    return json.loads(data)
 
-
-_words_re = re.compile('\S+|\s+')
+_diff_engine = DiffEngine(
+    opcodes=import_string(settings.SB_TEXTDIFF_BACKEND),
+    max_size=settings.SB_TEXTDIFF_MAX_SIZE,
+    max_cost=settings.SB_TEXTDIFF_MAX_COST,
+)
+_diff_cache = MemoCache('textdiff', settings.SB_TEXTDIFF_CACHE_SIZE)
 
 
 def textdiff(prev, new):
-    same_fmt = '<span class="same">%s</span>'
-    removed_fmt = '<span class="removed">%s</span>'
-    added_fmt = '<span class="added">%s</span>'
-    result = []
-
-    if prev and not prev.endswith('\n'):
-        prev = prev + '\n'
-    if new and not new.endswith('\n'):
-        new = new + '\n'
-
-    prev = prev.splitlines(True)
-    new = new.splitlines(True)
-    sm = difflib.SequenceMatcher(a=prev, b=new)
-    opcodes_stack = [(iter(sm.get_opcodes()), prev, new, 'lines')]
-    while opcodes_stack:
-        opcodes, prev, new, scope = opcodes_stack[-1]
-        for opcode, i1, i2, j1, j2 in opcodes:
-            if opcode == 'equal':
-                result.append(same_fmt % (''.join(new[j1:j2])))
-            elif opcode == 'delete':
-                result.append(removed_fmt % (''.join(prev[i1:i2])))
-            elif opcode == 'insert':
-                result.append(added_fmt % (''.join(new[j1:j2])))
-            elif opcode == 'replace':
-                if scope == 'lines':
-                    prevwords = _words_re.findall(''.join(prev[i1:i2]))
-                    newwords = _words_re.findall(''.join(new[j1:j2]))
-                    smwords = difflib.SequenceMatcher(a=prevwords, b=newwords)
-                    if smwords.quick_ratio() > 0.7:
-                        opcodes = smwords.get_opcodes()
-                        opcodes_stack.append((iter(opcodes), prevwords,
-                                              newwords, 'words'))
-                        break
-                result.append(removed_fmt % (''.join(prev[i1:i2])))
-                result.append(added_fmt % (''.join(new[j1:j2])))
-        else:
-            opcodes_stack.pop()
-    return jinja2.Markup(''.join(result))
+    key = ('textdiff', text_digest(prev, new))
+    return _diff_cache.get_or_compute(
+        key, lambda: jinja2.Markup(_diff_engine.textdiff(prev, new))
+    )
 
 
 def unidiff(prev, new):
-    if prev and not prev.endswith('\n'):
-        prev = prev + '\n'
-    if new and not new.endswith('\n'):
-        new = new + '\n'
-
-    prev = prev.splitlines(True)
-    new = new.splitlines(True)
-    sm = difflib.SequenceMatcher(a=prev, b=new)
-    result = []
-    for opcode, i1, i2, j1, j2 in sm.get_opcodes():
-        if opcode == 'equal':
-            for line in prev[i1:i2]:
-                result.append(' ' + line)
-        elif opcode in {'replace', 'delete'}:
-            for line in prev[i1:i2]:
-                result.append('-' + line)
-        if opcode in {'replace', 'insert'}:
-            for line in new[j1:j2]:
-                result.append('+' + line)
-    return ''.join(result)
+    key = ('unidiff', text_digest(prev, new))
+    return _diff_cache.get_or_compute(
+        key, lambda: _diff_engine.unidiff(prev, new)
+    )
 
 
 def pie(value, title=None):
@@ -215,12 +167,38 @@ def pie(value, title=None):
                          (value_rough, jinja2.escape(title or '')))
 
 
+class TimedTemplate(jinja2.Template):
+    """
+    Template which reports its rendering time to ``songbook.perf``.
+    Time of lazy querysets evaluated by the template is included.
+    """
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super(TimedTemplate, self).render(*args, **kwargs)
+        finally:
+            perf.record_template(time.perf_counter() - started)
+
+
 def environment(**options):
     extra_globals = options.pop('extra_globals', {})
     extra_filters = options.pop('extra_filters', {})
     extensions = ['jinja2.ext.i18n',
-                  'jinja2.ext.with_']
+                  'jinja2.ext.with_',
+                  'songbook.fragcache.FragmentCacheExtension']
+    bytecode_cache_dir = settings.SB_JINJA2_BYTECODE_CACHE_DIR
+    if bytecode_cache_dir:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+        options['bytecode_cache'] = jinja2.FileSystemBytecodeCache(
+            bytecode_cache_dir
+        )
     env = jinja2.Environment(**options, extensions=extensions)
+    if settings.SB_PERF_INSTRUMENTATION:
+        env.template_class = TimedTemplate
+    if settings.SB_FRAGMENT_CACHE_BACKEND:
+        env.fragment_cache = import_string(
+            settings.SB_FRAGMENT_CACHE_BACKEND
+        )()
     env.install_gettext_translations(translation, newstyle=True)
     env.globals.update({
         'messages': get_messages,
@@ -239,7 +217,6 @@ def environment(**options):
         'format_timedelta': format_timedelta,
         'format_datetime': format_datetime,
         'format_date': format_date,
-        'decode_json': decode_json,
         'markdown_safe': markdown_safe,
         'is_youtube_link': is_youtube_link,
         'get_youtube_embed_link': get_youtube_embed_link,
@@ -250,3 +227,13 @@ def environment(**options):
         k: import_string(v) for k, v in extra_filters.items()
     })
     return env
+
+
+def precompile_templates(env):
+    """
+    Load all templates, so that the first request served by a fresh
+    process doesn't have to wait for them to compile. With bytecode
+    cache enabled only templates changed since the last run are parsed.
+    """
+    for name in env.list_templates(extensions=['html']):
+        env.get_template(name)
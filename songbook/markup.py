@@ -0,0 +1,41 @@
+from django.conf import settings
+import jinja2
+import markdown
+
+from songbook.caching import MemoCache, text_digest
+
+
+_markdown_cache = MemoCache('markdown', settings.SB_MARKDOWN_CACHE_SIZE)
+
+
+def render_markdown(text):
+    def convert():
+        md = markdown.Markdown(output_format='html5')
+        return md.convert(jinja2.escape(text))
+    return _markdown_cache.get_or_compute(text_digest(text), convert)
+
+
+class MarkdownFieldsMixin:
+    """
+    Model mixin which keeps rendered html of markdown text fields.
+
+    For every name listed in ``markdown_fields`` the model must have
+    a nullable ``<name>_html`` column. It is filled on save, rows which
+    were not saved since the column was added are rendered on the fly.
+    """
+    markdown_fields = ()
+
+    def get_markdown_fields(self):
+        return self.markdown_fields
+
+    def save(self, *args, **kwargs):
+        for field in self.get_markdown_fields():
+            setattr(self, field + '_html',
+                    render_markdown(getattr(self, field)))
+        super(MarkdownFieldsMixin, self).save(*args, **kwargs)
+
+    def markdown_html(self, field):
+        html = getattr(self, field + '_html')
+        if html is None:
+            html = render_markdown(getattr(self, field))
+        return jinja2.Markup(html)
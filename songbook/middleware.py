@@ -0,0 +1,44 @@
+import inspect
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+
+from songbook import perf
+
+
+class PerformanceMiddleware:
+    """
+    Measures SQL queries, template rendering and cache lookups of every
+    request, reports them in ``Server-Timing`` header and adds them to
+    per-view summary.
+
+    Should go first in ``MIDDLEWARE_CLASSES`` to include time spent in
+    other middleware. Disabled unless ``SB_PERF_INSTRUMENTATION`` is set.
+    """
+    def __init__(self):
+        if not settings.SB_PERF_INSTRUMENTATION:
+            raise MiddlewareNotUsed()
+        connection_created.connect(perf.instrument_connection,
+                                   dispatch_uid='songbook.perf')
+
+    def process_request(self, request):
+        perf.start()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # decorated views are named by the function they wrap, and views
+        # which are instances like feeds by their class
+        view = inspect.unwrap(view_func)
+        request.perf_view_name = '%s.%s' % (
+            view.__module__, getattr(view, '__name__', type(view).__name__)
+        )
+
+    def process_response(self, request, response):
+        stats = perf.finish()
+        if stats is None:
+            return response
+        response['Server-Timing'] = stats.server_timing()
+        view_name = getattr(request, 'perf_view_name', None)
+        if view_name is not None:
+            perf.add_to_summary(view_name, stats)
+        return response
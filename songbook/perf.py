@@ -0,0 +1,179 @@
+"""
+Per-request performance counters.
+
+Collected while ``songbook.middleware.PerformanceMiddleware`` handles
+a request: SQL queries, template rendering and cache lookups report
+here if a request is being measured and cost a thread-local lookup
+otherwise. Finished requests are added to an in-process summary
+grouped by view.
+"""
+import functools
+import threading
+import time
+from collections import Counter
+
+from django.db.backends import utils as backend_utils
+
+
+_local = threading.local()
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_time = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = Counter()
+        self.cache_misses = Counter()
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """
+        Value of ``Server-Timing`` response header.
+
+        >>> stats = RequestStats()
+        >>> stats.sql_count, stats.sql_time = 3, 0.0125
+        >>> stats.cache_hits['markdown'] = 2
+        >>> stats.total_time = 0.05
+        >>> stats.server_timing()  # doctest: +NORMALIZE_WHITESPACE
+        'sql;dur=12.5;desc="3 queries", tpl;dur=0.0,
+         cache;desc="2 hits, 0 misses", total;dur=50.0'
+        """
+        return ', '.join([
+            'sql;dur=%.1f;desc="%d queries"' % (self.sql_time * 1000,
+                                                self.sql_count),
+            'tpl;dur=%.1f' % (self.template_time * 1000),
+            'cache;desc="%d hits, %d misses"' % (
+                sum(self.cache_hits.values()),
+                sum(self.cache_misses.values()),
+            ),
+            'total;dur=%.1f' % (self.total_time * 1000),
+        ])
+
+
+def start():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish():
+    stats = current()
+    _local.stats = None
+    if stats is not None:
+        stats.finish()
+    return stats
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def record_template(seconds):
+    stats = current()
+    if stats is not None:
+        stats.template_time += seconds
+
+
+def record_cache(name, hit):
+    stats = current()
+    if stats is not None:
+        if hit:
+            stats.cache_hits[name] += 1
+        else:
+            stats.cache_misses[name] += 1
+
+
+class _TimedCursorMixin:
+    def execute(self, sql, params=None):
+        return self._timed(super(_TimedCursorMixin, self).execute,
+                           sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(super(_TimedCursorMixin, self).executemany,
+                           sql, param_list)
+
+    def _timed(self, method, *args):
+        stats = current()
+        if stats is None:
+            return method(*args)
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            stats.sql_count += 1
+            stats.sql_time += time.perf_counter() - started
+
+
+class TimedCursorWrapper(_TimedCursorMixin, backend_utils.CursorWrapper):
+    pass
+
+
+class TimedCursorDebugWrapper(_TimedCursorMixin,
+                              backend_utils.CursorDebugWrapper):
+    pass
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """
+    ``connection_created`` signal handler which makes cursors of the
+    connection report their queries.
+    """
+    connection.make_cursor = functools.partial(TimedCursorWrapper,
+                                               db=connection)
+    connection.make_debug_cursor = functools.partial(TimedCursorDebugWrapper,
+                                                     db=connection)
+
+
+class ViewSummary:
+    def __init__(self, view_name):
+        self.view_name = view_name
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, stats):
+        self.count += 1
+        self.total_time += stats.total_time
+        self.max_time = max(self.max_time, stats.total_time)
+        self.sql_count += stats.sql_count
+        self.sql_time += stats.sql_time
+        self.template_time += stats.template_time
+        self.cache_hits += sum(stats.cache_hits.values())
+        self.cache_misses += sum(stats.cache_misses.values())
+
+    def average(self, attr):
+        return getattr(self, attr) / self.count
+
+
+_summary = {}
+_summary_lock = threading.Lock()
+
+
+def add_to_summary(view_name, stats):
+    with _summary_lock:
+        if view_name not in _summary:
+            _summary[view_name] = ViewSummary(view_name)
+        _summary[view_name].add(stats)
+
+
+def get_summary():
+    """
+    Return summaries of views served by this process, slowest first.
+    """
+    with _summary_lock:
+        summaries = list(_summary.values())
+    return sorted(summaries, key=lambda s: s.total_time, reverse=True)
+
+
+def reset_summary():
+    with _summary_lock:
+        _summary.clear()
@@ -46,9 +46,12 @@ INSTALLED_APPS = [
     'sbgig',
     'sbdashboard',
     'sbcomment',
+    'sbbench',
 ]
 
 MIDDLEWARE_CLASSES = [
+    'songbook.middleware.PerformanceMiddleware',
+
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -74,7 +77,7 @@ TEMPLATES = [
         'OPTIONS': {
             'environment': 'songbook.jinja2env.environment',
             'extra_globals': {
-                'all_gigs': "sbgig.jinja2env.all_gigs",
+                'gig_menu': "sbgig.jinja2env.gig_menu",
             },
         },
     },
@@ -107,6 +110,15 @@ DATABASES = {
     }
 }
 
+# reads of views decorated with songbook.db.read_only go to
+# SB_READ_DATABASE if it's set, e.g. to a second, read-only connection
+# to the same database (set in local settings, as tests can't share
+# uncommitted data between connections):
+#
+#   DATABASES['replica'] = dict(DATABASES['default'], ATOMIC_REQUESTS=False)
+#   SB_READ_DATABASE = 'replica'
+DATABASE_ROUTERS = ['songbook.db.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
@@ -162,6 +174,59 @@ STATICFILES_DIRS = [
 # songbook specific settings
 SB_COMMENTS_ON_PAGE = 20
 SB_UPDATE_COMMENT_GAP = 60
+# open pages wait for new comments up to SB_COMMENTS_WAIT_TIMEOUT seconds
+# holding a server thread, at most SB_COMMENTS_MAX_WAITERS of them per
+# process (keep it below the number of server threads, other pages
+# retry later); waiters check the cache every SB_COMMENTS_WAIT_RECHECK
+# seconds for comments saved by other processes, see sbcomment.notifier
+SB_COMMENTS_WAIT_TIMEOUT = 25
+SB_COMMENTS_WAIT_RECHECK = 5
+SB_COMMENTS_MAX_WAITERS = 10
+SB_MARKDOWN_CACHE_SIZE = 1000
+SB_TEXTDIFF_CACHE_SIZE = 2000
+# diffs of texts longer than SB_TEXTDIFF_MAX_SIZE characters or needing
+# more than SB_TEXTDIFF_MAX_COST edits are shown as a replaced block
+SB_TEXTDIFF_BACKEND = 'songbook.diff.myers_opcodes'
+SB_TEXTDIFF_MAX_SIZE = 100000
+SB_TEXTDIFF_MAX_COST = 300
+# compiled templates are kept here across restarts, set to None to disable
+SB_JINJA2_BYTECODE_CACHE_DIR = os.path.join(BASE_DIR, 'jinja2_cache')
+# compile all templates when wsgi application is loaded
+SB_JINJA2_PRECOMPILE = True
+# where {% cache %} keeps rendered template fragments, None to disable,
+# or 'songbook.fragcache.DjangoFragmentCache' to share them between
+# processes for SB_FRAGMENT_CACHE_TIMEOUT seconds
+SB_FRAGMENT_CACHE_BACKEND = 'songbook.fragcache.LocalFragmentCache'
+SB_FRAGMENT_CACHE_SIZE = 5000
+SB_FRAGMENT_CACHE_TIMEOUT = 3600
+# number of past gigs listed in navigation menu, None for all
+SB_GIG_MENU_PAST_GIGS = 10
+SB_GIG_MENU_CACHE_TIMEOUT = 300
+# setlists are also dropped from cache when songs or performers change
+SB_SETLIST_CACHE_TIMEOUT = 3600
+# gig feeds are also dropped from cache when comments or titles change
+SB_GIG_FEED_CACHE_TIMEOUT = 3600
+# alias of the database read-only views read from, see DATABASE_ROUTERS
+SB_READ_DATABASE = None
+# journal mode set on SQLite connections, None to leave it as is
+SB_SQLITE_JOURNAL_MODE = 'wal'
+# how bookkeeping jobs following writes are run, see sbcomment.jobs:
+# 'sync' (within the request, so pages reloaded after a change show its
+# comment), 'thread' (after the response by SB_JOBS_THREADS threads of
+# the process, for single process installs) or 'worker' (by manage.py
+# run_jobs, polling every SB_JOBS_POLL_INTERVAL seconds); failed queued
+# jobs are retried after SB_JOBS_RETRY_DELAY seconds, doubled with every
+# attempt
+SB_JOBS_MODE = 'sync'
+SB_JOBS_THREADS = 2
+SB_JOBS_BATCH_SIZE = 50
+SB_JOBS_CLAIM_TIMEOUT = 300
+SB_JOBS_POLL_INTERVAL = 1
+SB_JOBS_RETRY_DELAY = 10
+SB_JOBS_MAX_ATTEMPTS = 5
+# measure queries, template rendering and cache lookups of requests,
+# see Server-Timing response header and /perf/ page (staff only)
+SB_PERF_INSTRUMENTATION = False
 
 
 if 'SONGBOOK_LOCAL_SETTINGS' in os.environ:
@@ -22,12 +22,13 @@ sb.commentForm = function(container) {
 // must be in sync with SB_COMMENTS_ON_PAGE setting
 sb.COMMENTS_PAGE_SIZE = 20;
 
-sb.REFRESH_COMMENTS_EVERY = 45000;
+sb.RETRY_WAIT_COMMENTS_AFTER = 45000;
 
 sb.comments = function(container) {
   container = $(container);
   var comments = {'container': container};
   var baseUrl = container.data('url');
+  var waitUrl = container.data('wait-url');
   comments.limitNumComments = function(numCommentsToDisplay) {
     var toRemove = container.find('.comment').splice(numCommentsToDisplay, Infinity);
     var numToRemove = toRemove.length;
@@ -37,31 +38,51 @@ sb.comments = function(container) {
     }
     return numToRemove;
   }
+  comments.newestCommentSeq = function() {
+    return container.find('.comment:first-child').data('comment-seq');
+  }
+  comments.showNewComments = function(newComments) {
+    // a comment arrives again when it's updated, or when it's both waited
+    // for and explicitly refreshed, the newest copy is kept
+    newComments = $(newComments).filter('.comment');
+    newComments.each(function(idx, elem) {
+      container.find('#' + elem.id).remove();
+    });
+    var numCommentsToDisplay = container.find('.comment').length;
+    if (numCommentsToDisplay < sb.COMMENTS_PAGE_SIZE)
+      numCommentsToDisplay = sb.COMMENTS_PAGE_SIZE;
+    if (newComments.length) {
+      container.find('.comments-stream').prepend(newComments.hide());
+      comments.limitNumComments(numCommentsToDisplay);
+      setTimeout(function() {
+        newComments.slideDown();
+        container.trigger('newCommentsLoaded', [newComments]);
+      }, 0);
+    }
+  }
   comments.loadNewComments = function() {
-    var newestCommentId = container.find('.comment:first-child').data('comment-id');
+    var newestCommentSeq = comments.newestCommentSeq();
     var options = {};
-    if (newestCommentId)
-      options['not_before'] = newestCommentId;
-    $.get(baseUrl, options, function(newComments) {
-      newComments = $(newComments);
-      var numCommentsToDisplay = container.find('.comment').length;
-      if (numCommentsToDisplay < sb.COMMENTS_PAGE_SIZE)
-        numCommentsToDisplay = sb.COMMENTS_PAGE_SIZE;
-      if (newComments.length) {
-        container.find('.comments-stream').prepend(newComments.hide());
-        comments.limitNumComments(numCommentsToDisplay);
-        setTimeout(function() {
-          newComments.slideDown();
-          container.trigger('newCommentsLoaded', [newComments]);
-        }, 0);
-      }
+    if (newestCommentSeq)
+      options['after'] = newestCommentSeq;
+    $.get(baseUrl, options, comments.showNewComments);
+  }
+  comments.waitForNewComments = function() {
+    var options = {'after': comments.newestCommentSeq() || 0};
+    $.get(waitUrl, options).done(function(newComments, status, xhr) {
+      // 204 means nothing new has appeared for a while
+      if (xhr.status == 200)
+        comments.showNewComments(newComments);
+      setTimeout(comments.waitForNewComments, 0);
+    }).fail(function() {
+      setTimeout(comments.waitForNewComments, sb.RETRY_WAIT_COMMENTS_AFTER);
     });
   }
   comments.loadOldComments = function() {
-    var oldestCommentId = container.find('.comment:last-child').data('comment-id');
+    var oldestCommentSeq = container.find('.comment:last-child').data('comment-seq');
     var options = {};
-    if (oldestCommentId)
-      options['not_after'] = oldestCommentId;
+    if (oldestCommentSeq)
+      options['before'] = oldestCommentSeq;
     $.get(baseUrl, options, function(oldComments) {
       var numCommentsToDisplay = container.find('.comment').length;
       numCommentsToDisplay += sb.COMMENTS_PAGE_SIZE;
@@ -77,11 +98,7 @@ sb.comments = function(container) {
   comments.limitNumComments(sb.COMMENTS_PAGE_SIZE);
   container.find('.load-more-line button').click(comments.loadOldComments);
 
-  periodicallyLoadNewComments = function() {
-    setTimeout(periodicallyLoadNewComments, sb.REFRESH_COMMENTS_EVERY);
-    comments.loadNewComments();
-  }
-  setTimeout(periodicallyLoadNewComments, sb.REFRESH_COMMENTS_EVERY);
+  comments.waitForNewComments();
 
   container.get(0).setAttribute('data-comments', 1);
   container.data('comments', comments);
@@ -1,6 +1,22 @@
+from datetime import date
 import unittest
+from unittest import mock
 
-from songbook.jinja2env import textdiff
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+import jinja2
+
+from songbook import db
+from songbook import perf
+from songbook.caching import MemoCache
+from songbook.diff import (
+    DiffEngine, myers_opcodes, sequence_matcher_opcodes,
+)
+from songbook.jinja2env import environment, textdiff
+import sbgig.models
+import sbsong.models
 
 
 class TextdiffTestCase(unittest.TestCase):
@@ -74,3 +90,131 @@ hhoa
         self.assertEqual(str(res), """\
 <span class="removed">something
 </span>""")
+
+
+class DiffEngineTestCase(unittest.TestCase):
+    def test_too_large_is_replaced(self):
+        engine = DiffEngine(max_size=20)
+        res = engine.textdiff("foo\nbar\nbaz\n", "foo\nbar\nquux\n")
+        self.assertEqual(res, """\
+<span class="removed">foo
+bar
+baz
+</span><span class="added">foo
+bar
+quux
+</span>""")
+
+    def test_too_costly_is_replaced(self):
+        engine = DiffEngine(max_cost=1)
+        res = engine.textdiff("foo\nbar\n", "baz\nfoo\nquux\n")
+        self.assertEqual(res, """\
+<span class="removed">foo
+bar
+</span><span class="added">baz
+foo
+quux
+</span>""")
+
+    def test_myers_matches_sequence_matcher(self):
+        prev = "foo\nbar\nbaz\nquuxer word\nmoo\n"
+        new = "foo\nbaz\nquuxer another word\nmoo\nrab\n"
+        self.assertEqual(
+            DiffEngine(myers_opcodes).textdiff(prev, new),
+            DiffEngine(sequence_matcher_opcodes).textdiff(prev, new)
+        )
+
+
+class PerfTestCase(unittest.TestCase):
+    def test_memo_cache_hits_are_counted(self):
+        cache = MemoCache('test', 10)
+        stats = perf.start()
+        try:
+            for i in range(3):
+                cache.get_or_compute('key', lambda: 'value')
+        finally:
+            perf.finish()
+        self.assertEqual(stats.cache_hits['test'], 2)
+        self.assertEqual(stats.cache_misses['test'], 1)
+        self.assertIn('cache;desc="2 hits, 1 misses"', stats.server_timing())
+
+    def test_nothing_is_counted_outside_of_request(self):
+        MemoCache('test', 10).get_or_compute('key', lambda: 'value')
+        self.assertIsNone(perf.current())
+
+
+class FragmentCacheTestCase(unittest.TestCase):
+    def test_fragment_is_rendered_once_per_version(self):
+        env = environment(loader=jinja2.DictLoader({
+            'fragment.html': "{% cache 'test', version %}"
+                             "{{ render() }}{% endcache %}",
+        }))
+        template = env.get_template('fragment.html')
+        render = mock.Mock(side_effect=['first', 'second'])
+        self.assertEqual(template.render(version=1, render=render), 'first')
+        self.assertEqual(template.render(version=1, render=render), 'first')
+        self.assertEqual(template.render(version=2, render=render), 'second')
+
+
+class ReadReplicaRouterTestCase(unittest.TestCase):
+    @override_settings(SB_READ_DATABASE='replica')
+    def test_reads_of_read_only_views_are_routed(self):
+        router = db.ReadReplicaRouter()
+        Song = sbsong.models.Song
+        self.assertEqual(router.db_for_read(Song), 'default')
+        with db.reading_from_replica():
+            self.assertEqual(router.db_for_read(Song), 'replica')
+            self.assertEqual(router.db_for_write(Song), 'default')
+        self.assertEqual(router.db_for_read(Song), 'default')
+
+    def test_read_only_views_are_not_atomic(self):
+        view = db.read_only(lambda request: None)
+        self.assertEqual(view._non_atomic_requests, {'default'})
+
+
+class DirtyFieldsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='user')
+        gig = sbgig.models.Gig.objects.create(title='Gig', slug='gig',
+                                              date=date.today())
+        sbsong.models.Song.objects.create(
+            gig=gig, title='Song', suggested_by=user, changed_by=user,
+            lyrics='la la la\n' * 1000
+        )
+
+    def setUp(self):
+        self.song = sbsong.models.Song.objects.get()
+
+    def capture_save(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.song.save()
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_only_changed_columns_are_saved(self):
+        self.song.staffed = not self.song.staffed
+        [update] = self.capture_save()
+        self.assertIn('"staffed"', update)
+        self.assertNotIn('"lyrics"', update)
+        self.assertLess(len(update) * 10, len(self.song.lyrics))
+
+        self.song.staffed = not self.song.staffed
+        with CaptureQueriesContext(connection) as queries:
+            self.song.save(update_fields=None)
+        [full_update] = [q['sql'] for q in queries.captured_queries]
+        self.assertIn('"lyrics"', full_update)
+
+    def test_repeated_saves_write_new_changes_only(self):
+        self.assertEqual(self.capture_save(), [])
+        self.song.readiness = (self.song.readiness + 1) % 100
+        self.assertEqual(len(self.capture_save()), 1)
+        self.assertEqual(self.capture_save(), [])
+        old_title = self.song.title
+        self.song.title = 'New title'
+        [update] = self.capture_save()
+        self.assertNotIn('"readiness"', update)
+        self.assertEqual(self.song._pristine['title'], old_title)
+        self.assertEqual(
+            sbsong.models.Song.objects.get(pk=self.song.pk).title,
+            'New title'
+        )
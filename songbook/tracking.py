@@ -0,0 +1,132 @@
+from django.db.models import F
+
+
+class DirtyFieldsMixin:
+    """
+    Model mixin which saves only columns changed since the instance was
+    loaded or last saved.
+
+    Values loaded from the database are only referenced when instances
+    are created, so instances which are never saved cost nothing extra.
+    ``_pristine`` maps attribute names of loaded fields to their values
+    as they were loaded, regardless of later saves. Saves of instances
+    which were not loaded from the database, and saves given explicit
+    ``update_fields`` (``None`` for all), work as usual.
+
+    If ``version_field`` names an integer field, it's incremented in the
+    database by every save which writes anything, so validators of pages
+    showing the instance don't depend on timestamps.
+    """
+    version_field = None
+
+    _loaded = None
+    _saved_values = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(DirtyFieldsMixin, cls).from_db(db, field_names,
+                                                        values)
+        instance._loaded = (field_names, values)
+        return instance
+
+    @property
+    def _pristine(self):
+        if self._loaded is None:
+            return {}
+        return dict(zip(*self._loaded))
+
+    def get_dirty_fields(self):
+        """
+        Return names of fields changed since the instance was loaded or
+        last saved, or None if that isn't known.
+        """
+        if self._saved_values is not None:
+            known = self._saved_values
+        elif self._loaded is not None:
+            known = self._pristine
+        else:
+            return None
+        dirty = []
+        for field in self._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            if getattr(field, 'auto_now', False):
+                dirty.append(field.name)
+            elif field.attname in known:
+                if getattr(self, field.attname) != known[field.attname]:
+                    dirty.append(field.name)
+            elif field.attname in self.__dict__:
+                # deferred when loaded and assigned since
+                dirty.append(field.name)
+        return dirty
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and self.pk is not None and not args
+                and 'update_fields' not in kwargs
+                and not kwargs.get('force_insert')):
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                # nothing at all is saved if nothing has changed
+                kwargs['update_fields'] = dirty
+        update_fields = kwargs.get('update_fields')
+        bump = self.version_field is not None and (update_fields is None
+                                                   or update_fields)
+        if bump:
+            version = self._bump_version(kwargs)
+        try:
+            super(DirtyFieldsMixin, self).save(*args, **kwargs)
+        finally:
+            if bump:
+                self._set_version(version)
+        if bump and version is not None:
+            self._set_version(version + 1)
+        update_fields = kwargs.get('update_fields')
+        saved_values = self._saved_values
+        if saved_values is None:
+            saved_values = self._pristine
+        if update_fields is None:
+            saved_fields = self._meta.concrete_fields
+        else:
+            update_fields = set(update_fields)
+            saved_fields = [field for field in self._meta.concrete_fields
+                            if field.name in update_fields
+                            or field.attname in update_fields]
+        for field in saved_fields:
+            if field.attname in self.__dict__:
+                saved_values[field.attname] = getattr(self, field.attname)
+        self._saved_values = saved_values
+
+    def _bump_version(self, kwargs):
+        """
+        Set the version field to be incremented by the save given
+        ``kwargs``; return its value before, None if it's deferred.
+        """
+        field = self.version_field
+        version = self.__dict__.get(field)
+        if (self._state.adding or self.pk is None
+                or kwargs.get('force_insert')):
+            version = getattr(self, field)
+            setattr(self, field, version + 1)
+            return version
+        # concurrent saves each count
+        setattr(self, field, F(field) + 1)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and field not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + [field]
+        return version
+
+    def _set_version(self, version):
+        if version is None:
+            # deferred again, the value is loaded when accessed
+            self.__dict__.pop(self.version_field, None)
+        else:
+            setattr(self, self.version_field, version)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super(DirtyFieldsMixin, self).refresh_from_db(*args, **kwargs)
+        if self._saved_values is None:
+            self._saved_values = dict(self._pristine)
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__:
+                self._saved_values[field.attname] = getattr(self,
+                                                            field.attname)
@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "songbook.settings")
 
 application = get_wsgi_application()
+
+
+def _precompile_templates():
+    from django.conf import settings
+    from django.template import engines
+    from songbook.jinja2env import precompile_templates
+
+    if settings.SB_JINJA2_PRECOMPILE:
+        precompile_templates(engines['jinja2'].env)
+
+
+_precompile_templates()